@@ -1,7 +1,8 @@
+from django import forms
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import User
-from django.db.models import Count , Sum , Avg
+from django.db.models import Avg
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils import timezone
@@ -9,7 +10,19 @@ from .models import (
     Employee , Team , TeamMembership , Project ,
     Task , Comment , TimeEntry
 )
-from django.db import models
+
+from .graph import CycleError , find_dependency_cycle
+
+
+class EmployeeListFilter(admin.RelatedFieldListFilter):
+    """Lists employees with their users joined instead of one user query per choice"""
+
+    def field_choices(self , field , request , model_admin):
+        ordering = self.field_admin_ordering(field , request , model_admin)
+        employees = field.related_model._default_manager.select_related('user')
+        if ordering:
+            employees = employees.order_by(*ordering)
+        return [(employee.pk , str(employee)) for employee in employees]
 
 
 # Employee Admin
@@ -81,19 +94,12 @@ class TeamAdmin(admin.ModelAdmin):
 
     def get_queryset(self , request):
         queryset = super().get_queryset(request)
-        return queryset.annotate(
-            member_count=Count('members' , distinct=True) ,
-            active_projects_count=Count(
-                'projects' ,
-                filter=models.Q(projects__status__in=['not_started' , 'in_progress']) ,
-                distinct=True
-            )
-        )
+        return queryset.with_counts()
 
     def member_count(self , obj):
-        return obj.member_count
+        return obj.members_count
 
-    member_count.admin_order_field = 'member_count'
+    member_count.admin_order_field = 'members_count'
 
     def active_projects_count(self , obj):
         return obj.active_projects_count
@@ -125,6 +131,7 @@ class TaskInline(admin.TabularInline):
 class ProjectAdmin(admin.ModelAdmin):
     list_display = ('name' , 'team' , 'project_manager' , 'start_date' , 'end_date' ,
                     'status' , 'priority' , 'budget_status')
+    list_select_related = ('team' , 'project_manager__user' , 'stats')
     list_filter = ('status' , 'priority' , 'team' , 'is_archived')
     search_fields = ('name' , 'description' , 'team__name' , 'project_manager__user__username')
     readonly_fields = ('created_at' , 'updated_at')
@@ -172,13 +179,12 @@ class ProjectAdmin(admin.ModelAdmin):
     def budget_status(self , obj):
         if not obj.budget:
             return "No budget set"
-        total_cost = TimeEntry.objects.filter(
-            task__project=obj
-        ).aggregate(
-            total=Sum('hours_spent')
-        )['total'] or 0
+        stats = getattr(obj , 'stats' , None)
+        total_cost = stats.cost if stats else 0
         return f"${total_cost:,.2f} / ${obj.budget:,.2f}"
 
+    budget_status.admin_order_field = 'stats__cost'
+
     actions = ['archive_projects' , 'unarchive_projects']
 
     def archive_projects(self , request , queryset):
@@ -204,25 +210,45 @@ class TimeEntryInline(admin.TabularInline):
     readonly_fields = ('created_at' ,)
 
 
+class TaskAdminForm(forms.ModelForm):
+    class Meta:
+        model = Task
+        fields = '__all__'
+
+    def clean_dependencies(self):
+        dependencies = self.cleaned_data['dependencies']
+        # A new task has no dependents yet, so only changes can close a cycle
+        if self.instance.pk is not None:
+            cycle = find_dependency_cycle(self.instance.pk , {task.pk for task in dependencies})
+            if cycle:
+                raise forms.ValidationError(str(CycleError(cycle)))
+        return dependencies
+
+
 @admin.register(Task)
 class TaskAdmin(admin.ModelAdmin):
+    form = TaskAdminForm
     list_display = ('title' , 'project' , 'assigned_to' , 'due_date' , 'status' ,
                     'priority' , 'time_logged' , 'completion_percentage')
+    list_select_related = ('project' , 'assigned_to__user')
     list_filter = ('status' , 'priority' , 'project__team' , 'project')
     search_fields = ('title' , 'description' , 'assigned_to__user__username')
     readonly_fields = ('created_at' , 'updated_at')
     inlines = [CommentInline , TimeEntryInline]
     autocomplete_fields = ['project' , 'assigned_to' , 'parent_task' , 'dependencies']
 
+    def get_queryset(self , request):
+        return super().get_queryset(request).with_time_logged()
+
     def time_logged(self , obj):
-        total_hours = obj.time_entries.aggregate(
-            total=Sum('hours_spent')
-        )['total'] or 0
+        total_hours = obj.time_logged or 0
         estimated = obj.estimated_hours or 0
         if estimated:
             return f"{total_hours:.1f}hrs / {estimated:.1f}hrs"
         return f"{total_hours:.1f}hrs"
 
+    time_logged.admin_order_field = 'time_logged'
+
     actions = ['mark_completed' , 'mark_in_progress']
 
     def mark_completed(self , request , queryset):
@@ -239,7 +265,8 @@ class TaskAdmin(admin.ModelAdmin):
 @admin.register(TimeEntry)
 class TimeEntryAdmin(admin.ModelAdmin):
     list_display = ('employee' , 'task' , 'date' , 'hours_spent' , 'created_at')
-    list_filter = ('date' , 'employee' , 'task__project')
+    list_select_related = ('employee__user' , 'task')
+    list_filter = ('date' , ('employee' , EmployeeListFilter) , 'task__project')
     search_fields = ('employee__user__username' , 'task__title' , 'description')
     readonly_fields = ('created_at' , 'updated_at')
     autocomplete_fields = ['task' , 'employee']
@@ -254,7 +281,8 @@ class TimeEntryAdmin(admin.ModelAdmin):
 @admin.register(Comment)
 class CommentAdmin(admin.ModelAdmin):
     list_display = ('task' , 'author' , 'content_preview' , 'created_at')
-    list_filter = ('created_at' , 'author' , 'task__project')
+    list_select_related = ('task' , 'author__user')
+    list_filter = ('created_at' , ('author' , EmployeeListFilter) , 'task__project')
     search_fields = ('content' , 'author__user__username' , 'task__title')
     readonly_fields = ('created_at' , 'updated_at')
     autocomplete_fields = ['task' , 'author']
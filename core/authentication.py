@@ -0,0 +1,104 @@
+"""
+JWT authentication without a user query per request.
+
+``CachedJWTAuthentication`` keeps the users it has loaded in a bounded
+in-process LRU keyed by the token's user id. ``core.signals`` drops a
+user from it whenever the row is saved or deleted in this process;
+entries also expire after ``JWT_USER_CACHE_TIMEOUT`` seconds, which
+bounds how long other processes, and ``QuerySet.update`` calls that send
+no signals, can serve a stale or deactivated user.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+CACHE_SIZE = getattr(settings, 'JWT_USER_CACHE_SIZE', 1024)
+CACHE_TIMEOUT = getattr(settings, 'JWT_USER_CACHE_TIMEOUT', 60)
+
+
+class UserCache:
+    """
+    Thread-safe LRU of users with a per-entry timeout. Ids are compared as
+    strings, the form tokens carry them in.
+    """
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # Bumped on every invalidation, so a user loaded before one is not stored after it
+        self.generation = 0
+
+    def get(self, user_id):
+        user_id = str(user_id)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            user, expires = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return user
+
+    def set(self, user_id, user, generation=None):
+        user_id = str(user_id)
+        with self.lock:
+            if generation is not None and generation != self.generation:
+                return
+            self.entries[user_id] = (user, time.monotonic() + self.timeout)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.generation += 1
+            self.entries.pop(str(user_id), None)
+
+    def clear(self):
+        with self.lock:
+            self.generation += 1
+            self.entries.clear()
+
+
+user_cache = UserCache(CACHE_SIZE, CACHE_TIMEOUT)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """``JWTAuthentication`` that looks users up in ``user_cache`` before the database"""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = user_cache.get(user_id)
+        if user is None:
+            generation = user_cache.generation
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, user, generation)
+        else:
+            self.check_user(user, validated_token)
+        # Requests must not share an instance they might modify
+        return copy.copy(user)
+
+    def check_user(self, user, validated_token):
+        """The checks ``JWTAuthentication.get_user`` runs on users it loads"""
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and (
+            validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password)
+        ):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
@@ -0,0 +1,467 @@
+"""
+API performance benchmarks.
+
+Seeds a parameterized dataset and records the query count, database time
+and wall time of every router endpoint in ``core.urls`` plus the admin
+changelists. Results are compared against the budgets below and can be
+written to a JSON report for comparison across commits.
+
+Run through the test runner, optionally scaling the dataset and saving
+the report::
+
+    PERF_SCALE=10 PERF_REPORT=perf.json python manage.py test core.tests.PerformanceBudgetTests
+
+``export_scaling`` measures the test case export the same way, recording
+export time and peak memory against the size of the suite, and
+``serializer_throughput`` compares the rows per second of a list
+serializer with its ``core.fast_list`` compiled form. ``renderer_throughput``
+times the response renderers on project and task payloads and
+``auth_throughput`` the requests per second of a JWT-authenticated
+endpoint with and without the cached user lookup.
+"""
+import datetime
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import django
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Prefetch
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import renderers, views
+from .authentication import CachedJWTAuthentication, user_cache
+
+from pm.models import TestCase, TestCategory, TestEnvironment, TestPriority, TestStep
+from pm.resources import TestCaseResource
+from .fast_list import compile_serializer
+from .models import Employee, Team, TeamMembership, Project, Task, Comment, TimeEntry
+from .budget import burn_down
+from .serializers import ProjectDetailSerializer, TaskDetailSerializer, TaskSerializer, TimeEntrySerializer
+from .urls import router
+
+# Maximum number of queries per endpoint, keyed by URL name. Endpoints not
+# listed here fall back to DEFAULT_QUERY_BUDGET so new views are covered too.
+# List and detail views include the aggregate behind their ETag.
+QUERY_BUDGETS = {
+    'employee-list': 4,
+    'employee-detail': 3,
+    'employee-tasks': 4,
+    'employee-capacity': 3,
+    'team-list': 4,
+    'team-detail': 5,
+    'project-list': 3,
+    'project-detail': 9,
+    'project-tasks-summary': 1,
+    'project-schedule': 3,
+    'project-burn-down': 2,
+    'project-timeline': 3,
+    'task-list': 4,
+    'task-detail': 8,
+    'task-tree': 2,
+    'comment-list': 3,
+    'comment-detail': 2,
+    'timeentry-list': 3,
+    'timeentry-detail': 2,
+    'timeentry-export': 1,
+}
+DEFAULT_QUERY_BUDGET = 10
+
+# Admin changelists select or annotate every column they display, so
+# their cost does not grow with the page size.
+ADMIN_QUERY_BUDGETS = {
+    'core_employee': 13,
+    'core_team': 11,
+    'core_project': 8,
+    'core_task': 9,
+    'core_comment': 9,
+    'core_timeentry': 9,
+    'core_teammembership': 9,
+    'pm_testcase': 12,
+    'pm_teststep': 8,
+    'pm_testcategory': 7,
+    'pm_testpriority': 7,
+    'pm_testenvironment': 7,
+}
+
+# Wall time budget in milliseconds, deliberately loose to tolerate slow CI
+WALL_TIME_BUDGET = int(os.environ.get('PERF_WALL_TIME_BUDGET', 2000))
+
+
+def seed_dataset(scale=1, teams=2, projects_per_team=2, tasks_per_project=100,
+                 members_per_team=10, entries_per_task=2, comments_per_task=2,
+                 cases_per_project=50, steps_per_case=4):
+    """Create a realistic dataset with bulk inserts and return its size"""
+    today = timezone.now().date()
+    tasks_per_project *= scale
+    cases_per_project *= scale
+
+    users = User.objects.bulk_create([
+        User(username=f'bench-{i}', first_name='Bench', last_name=str(i))
+        for i in range(teams * members_per_team)
+    ])
+    employees = Employee.objects.bulk_create([
+        Employee(user=user, position='Engineer', department='R&D', hourly_rate=50 + i % 5 * 10)
+        for i, user in enumerate(users)
+    ])
+    team_objs = Team.objects.bulk_create([
+        Team(name=f'Bench team {i}', team_lead=employees[i * members_per_team])
+        for i in range(teams)
+    ])
+    TeamMembership.objects.bulk_create([
+        TeamMembership(team=team, employee=employees[t * members_per_team + m])
+        for t, team in enumerate(team_objs)
+        for m in range(members_per_team)
+    ])
+    projects = Project.objects.bulk_create([
+        Project(
+            name=f'Bench project {t}-{p}', description='Benchmark project', team=team,
+            project_manager=team.team_lead, start_date=today - datetime.timedelta(days=365),
+            status='in_progress', budget=100000,
+        )
+        for t, team in enumerate(team_objs)
+        for p in range(projects_per_team)
+    ])
+
+    statuses = [choice for choice, _ in Task.STATUS_CHOICES]
+    tasks = Task.objects.bulk_create([
+        Task(
+            project=project, title=f'Task {i}', description='Benchmark task ' * 20,
+            due_date=today + datetime.timedelta(days=i % 60 - 30), status=statuses[i % len(statuses)],
+            assigned_to=employees[i % len(employees)], estimated_hours=8,
+        )
+        for project in projects
+        for i in range(tasks_per_project)
+    ])
+    # Make every fifth task a subtask of, and dependent on, its predecessor
+    subtasks = []
+    for start in range(0, len(tasks), tasks_per_project):
+        for i in range(start + 1, start + tasks_per_project, 5):
+            tasks[i].parent_task = tasks[i - 1]
+            subtasks.append(tasks[i])
+    Task.objects.bulk_update(subtasks, ['parent_task'])
+    Task.dependencies.through.objects.bulk_create([
+        Task.dependencies.through(from_task=task, to_task=task.parent_task)
+        for task in subtasks
+    ])
+
+    TimeEntry.objects.bulk_create([
+        TimeEntry(task=task, employee=task.assigned_to, hours_spent=1 + i,
+                  date=today - datetime.timedelta(days=i))
+        for task in tasks
+        for i in range(entries_per_task)
+    ])
+    Comment.objects.bulk_create([
+        Comment(task=task, author=task.assigned_to, content='Benchmark comment')
+        for task in tasks
+        for i in range(comments_per_task)
+    ])
+
+    category = TestCategory.objects.create(name='Regression')
+    priority = TestPriority.objects.create(name='P1', description='High', order=1)
+    environment = TestEnvironment.objects.create(name='QA')
+    cases = TestCase.objects.bulk_create([
+        TestCase(
+            project=project, category=category, priority=priority, environment=environment,
+            title=f'Case {i}', description='Benchmark case', assigned_to=users[i % len(users)],
+            created_by=users[0],
+        )
+        for project in projects
+        for i in range(cases_per_project)
+    ])
+    step_statuses = [choice for choice, _ in TestStep.STATUS_CHOICES]
+    TestStep.objects.bulk_create([
+        TestStep(test_case=case, step_number=n + 1, action='Do something',
+                 expected_result='It works', status=step_statuses[(i + n) % len(step_statuses)])
+        for i, case in enumerate(cases)
+        for n in range(steps_per_case)
+    ])
+    TestCase.dependent_on.through.objects.bulk_create([
+        TestCase.dependent_on.through(from_testcase=cases[i], to_testcase=cases[i - 1])
+        for i in range(1, len(cases), 3)
+    ])
+
+    return {
+        'employees': len(employees),
+        'teams': len(team_objs),
+        'projects': len(projects),
+        'tasks': len(tasks),
+        'time_entries': TimeEntry.objects.count(),
+        'comments': Comment.objects.count(),
+        'test_cases': len(cases),
+        'test_steps': TestStep.objects.count(),
+    }
+
+
+def api_endpoints():
+    """Yield ``(name, url)`` for every GET endpoint registered on the API router"""
+    for prefix, viewset, basename in router.registry:
+        model = viewset.queryset.model
+        obj = model.objects.order_by('pk').first()
+        yield f'{basename}-list', reverse(f'{basename}-list')
+        if obj is None:
+            continue
+        yield f'{basename}-detail', reverse(f'{basename}-detail', args=[obj.pk])
+        for extra_action in viewset.get_extra_actions():
+            if 'get' not in extra_action.mapping:
+                continue
+            name = f'{basename}-{extra_action.url_name}'
+            args = [obj.pk] if extra_action.detail else []
+            yield name, reverse(name, args=args)
+
+
+def admin_endpoints():
+    """Yield ``(name, url)`` for the changelist of every registered model admin"""
+    for model in admin.site._registry:
+        opts = model._meta
+        name = f'{opts.app_label}_{opts.model_name}'
+        if name in ADMIN_QUERY_BUDGETS:
+            yield name, reverse(f'admin:{name}_changelist')
+
+
+def measure(client, url):
+    """Request ``url`` and return its status, query count, DB time and wall time"""
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(url)
+        if response.streaming:
+            b''.join(response.streaming_content)
+        wall_time = time.perf_counter() - start
+    return {
+        'status': response.status_code,
+        'queries': len(queries),
+        'db_ms': round(sum(float(query['time']) for query in queries) * 1000, 3),
+        'wall_ms': round(wall_time * 1000, 3),
+    }
+
+
+def run_suite(api_client, admin_client):
+    """Measure every endpoint and return one result dict per endpoint"""
+    results = []
+    suites = [
+        ('api', api_client, api_endpoints(), QUERY_BUDGETS),
+        ('admin', admin_client, admin_endpoints(), ADMIN_QUERY_BUDGETS),
+    ]
+    for kind, client, endpoints, budgets in suites:
+        for name, url in endpoints:
+            # Warm up once so that one-off costs (URL resolving, template
+            # loading, content types) are not attributed to the endpoint.
+            client.get(url)
+            result = {'kind': kind, 'name': name, 'url': url}
+            result.update(measure(client, url))
+            result['query_budget'] = budgets.get(name, DEFAULT_QUERY_BUDGET)
+            result['wall_ms_budget'] = WALL_TIME_BUDGET
+            results.append(result)
+    return results
+
+
+def budget_violations(results):
+    """Return a human readable message for every result over its budget"""
+    violations = []
+    for result in results:
+        if result['status'] != 200:
+            violations.append(f"{result['name']}: HTTP {result['status']}")
+        if result['queries'] > result['query_budget']:
+            violations.append(
+                f"{result['name']}: {result['queries']} queries (budget {result['query_budget']})"
+            )
+        if result['wall_ms'] > result['wall_ms_budget']:
+            violations.append(
+                f"{result['name']}: {result['wall_ms']:.0f}ms (budget {result['wall_ms_budget']}ms)"
+            )
+    return violations
+
+
+def access_paths():
+    """Return ``(name, queryset, expected index)`` for the hot filter and ordering paths"""
+    today = timezone.now().date()
+    project = Project.objects.order_by('pk').first()
+    employee = Employee.objects.order_by('pk').first()
+    task = Task.objects.order_by('pk').first()
+    return [
+        ('task-by-project-status', Task.objects.filter(project=project, status='pending'),
+         'task_project_status_due_idx'),
+        ('task-overdue', Task.objects.filter(
+            project=project, due_date__lt=today, status__in=['pending', 'in_progress']
+        ), 'task_project_status_due_idx'),
+        ('task-by-assignee-status', Task.objects.filter(assigned_to=employee, status='pending'),
+         'task_assignee_status_due_idx'),
+        ('task-by-status', Task.objects.filter(status='pending'), 'task_status_due_idx'),
+        ('task-default-ordering', Task.objects.order_by('due_date', 'priority', 'id')[:10],
+         'task_due_priority_idx'),
+        ('timeentry-by-employee', TimeEntry.objects.filter(employee=employee).order_by('-date'),
+         'timeentry_employee_date_idx'),
+        ('timeentry-by-task', TimeEntry.objects.filter(task=task).order_by('-date'),
+         'timeentry_task_date_idx'),
+        ('timeentry-default-ordering', TimeEntry.objects.order_by('-date', 'id')[:10], 'timeentry_date_idx'),
+        ('comment-by-task', Comment.objects.filter(task=task).order_by('-created_at'),
+         'comment_task_created_idx'),
+    ]
+
+
+def explain_access_paths():
+    """Return the query plan of every access path and whether it uses its index"""
+    plans = []
+    for name, queryset, index in access_paths():
+        plan = queryset.explain()
+        plans.append({'name': name, 'index': index, 'uses_index': index in plan, 'plan': plan})
+    return plans
+
+
+def measure_export(export):
+    """Run ``export`` and record its row count, queries, wall time and peak traced memory"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        with CaptureQueriesContext(connection) as ctx:
+            rows = export()
+        wall_ms = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'rows': rows, 'queries': len(ctx), 'wall_ms': round(wall_ms, 2), 'peak_kb': round(peak / 1024, 1)}
+
+
+def export_scaling(sizes):
+    """
+    Export the first ``size`` test cases for each of ``sizes``, both
+    streamed row by row and built into a ``Dataset`` as the admin does.
+    """
+    resource = TestCaseResource()
+    pks = list(TestCase.objects.order_by('pk').values_list('pk', flat=True))
+    results = []
+    for size in sizes:
+        queryset = TestCase.objects.filter(pk__lte=pks[size - 1]).order_by('pk')
+        results.append({'mode': 'stream', 'cases': size, **measure_export(
+            lambda: sum(1 for _ in resource.iter_export(queryset))
+        )})
+        results.append({'mode': 'dataset', 'cases': size, **measure_export(
+            lambda: len(resource.export(queryset))
+        )})
+    return results
+
+
+def serializer_throughput(serializer_class, queryset, repeat=3):
+    """
+    Render ``queryset`` with ``serializer_class`` and with its compiled
+    form, recording the best rows per second of ``repeat`` runs of each
+    and whether both render the same JSON.
+    """
+    compiled = compile_serializer(serializer_class())
+    runs = {
+        'serializer': lambda: serializer_class(queryset.all(), many=True).data,
+        'compiled': lambda: compiled.serialize(compiled.rows(queryset.all())),
+    }
+    results, rendered = {}, {}
+    for name, run in runs.items():
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            data = run()
+            best = min(best, time.perf_counter() - start)
+        rendered[name] = JSONRenderer().render(data)
+        results[name] = {'rows': len(data), 'rows_per_second': round(len(data) / best) if best else None}
+    return {
+        'name': serializer_class.__name__, **results,
+        'identical': rendered['serializer'] == rendered['compiled'],
+    }
+
+
+def list_throughput():
+    """``serializer_throughput`` of the task and time entry lists over the whole dataset"""
+    dependencies = Prefetch('dependencies', queryset=Task.objects.only('id').order_by(*Task._meta.ordering, 'pk'))
+    return [
+        serializer_throughput(TaskSerializer, Task.objects.prefetch_related(dependencies)),
+        serializer_throughput(TimeEntrySerializer, TimeEntry.objects.all()),
+    ]
+
+
+def renderer_payloads():
+    """Response data of realistic size: project and task details, the full task list and a burn-down"""
+    project = Project.objects.with_task_counts().first()
+    return {
+        'projects': ProjectDetailSerializer(Project.objects.with_task_counts(), many=True).data,
+        'task-details': TaskDetailSerializer(
+            Task.objects.with_time_logged().select_related('project', 'assigned_to__user')[:100], many=True
+        ).data,
+        'tasks': TaskSerializer(Task.objects.prefetch_related('dependencies'), many=True).data,
+        'burn-down': burn_down(project, 'day'),
+    }
+
+
+def renderer_throughput(payloads, repeat=5):
+    """
+    Render every payload with DRF's JSONRenderer, FastJSONRenderer and,
+    when msgpack is installed, MessagePackRenderer, recording the best
+    time of ``repeat`` runs, the size and whether the JSON matches DRF's.
+    """
+    candidates = [JSONRenderer(), renderers.FastJSONRenderer()]
+    if renderers.msgpack is not None:
+        candidates.append(renderers.MessagePackRenderer())
+    results = []
+    for name, data in payloads.items():
+        expected = JSONRenderer().render(data)
+        for renderer in candidates:
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                body = renderer.render(data)
+                best = min(best, time.perf_counter() - start)
+            results.append({
+                'payload': name, 'renderer': type(renderer).__name__, 'ms': round(best * 1000, 3),
+                'bytes': len(body), 'matches_json': body == expected if renderer.format == 'json' else None,
+            })
+    return results
+
+
+def auth_throughput(user, requests=200):
+    """
+    Send ``requests`` JWT-authenticated team list requests (answered from
+    the response cache after the first) with DRF's ``JWTAuthentication``
+    and with ``CachedJWTAuthentication``, recording requests per second
+    and the queries each request runs.
+    """
+    factory = APIRequestFactory()
+    token = str(AccessToken.for_user(user))
+    results = []
+    for authentication in (JWTAuthentication, CachedJWTAuthentication):
+        user_cache.clear()
+        view = views.TeamViewSet.as_view({'get': 'list'}, authentication_classes=[authentication])
+        view(factory.get('/api/teams/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        with CaptureQueriesContext(connection) as ctx:
+            start = time.perf_counter()
+            for _ in range(requests):
+                response = view(factory.get('/api/teams/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+                response.render()
+            elapsed = time.perf_counter() - start
+        results.append({
+            'authentication': authentication.__name__, 'status': response.status_code,
+            'requests_per_second': round(requests / elapsed), 'queries_per_request': len(ctx) / requests,
+        })
+    return results
+
+
+def write_report(path, dataset, results, plans=(), throughput=()):
+    """Write the benchmark results and query plans as JSON"""
+    report = {
+        'generated_at': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'dataset': dataset,
+        'results': results,
+        'plans': list(plans),
+        'throughput': list(throughput),
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
@@ -0,0 +1,52 @@
+"""
+Budget burn of a project over time.
+
+Costs are hours logged priced at each employee's hourly rate, grouped per
+day or week in the database. The running totals are built over the whole
+timeline in one pass with ``itertools.accumulate`` and returned as
+parallel arrays, which stay cheap to render for multi-year projects.
+"""
+import datetime
+from decimal import Decimal
+from itertools import accumulate
+
+from django.utils import timezone
+
+from .models import TimeEntry
+
+INTERVALS = {'day': 1, 'week': 7}
+
+
+def period_start(date, interval):
+    return date - datetime.timedelta(days=date.weekday()) if interval == 'week' else date
+
+
+def burn_down(project, interval='day'):
+    """
+    Return the cost per period from the project start (or the first logged
+    entry if earlier) until its end date (or today, or the last logged
+    entry if later), the cumulative cost, the budget remaining after each
+    period and a linear planned burn.
+    """
+    costs = dict(TimeEntry.objects.filter(task__project=project).cost_by_period(interval))
+    step = datetime.timedelta(days=INTERVALS[interval])
+    # Entries logged before the start date still count towards the project's cost
+    start = period_start(min(project.start_date, *costs), interval)
+    end = period_start(max(project.end_date or timezone.now().date(), *costs, project.start_date), interval)
+    count = (end - start) // step + 1
+
+    periods = [start + step * i for i in range(count)]
+    per_period = [costs.get(period) or Decimal(0) for period in periods]
+    cumulative = list(accumulate(per_period))
+    budget = project.budget
+
+    return {
+        'interval': interval,
+        'budget': budget,
+        'total_cost': cumulative[-1].quantize(Decimal('0.01')),
+        'periods': [period.isoformat() for period in periods],
+        'cost': [round(float(value), 2) for value in per_period],
+        'cumulative_cost': [round(float(value), 2) for value in cumulative],
+        'remaining_budget': [round(float(budget - value), 2) for value in cumulative] if budget is not None else None,
+        'planned_cost': [round(float(budget) * (i + 1) / count, 2) for i in range(count)] if budget is not None else None,
+    }
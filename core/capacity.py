@@ -0,0 +1,87 @@
+"""
+Employee workload per week.
+
+Planned hours are the ``estimated_hours`` of open tasks, counted in the
+week of their ``due_date`` since tasks have no start date. Logged hours
+are the time entries of the week. Both are grouped per employee and week
+in the database and spread over a dense employee x week matrix.
+"""
+import datetime
+from decimal import Decimal
+
+from django.db import models
+from django.db.models.functions import TruncWeek
+
+from .budget import period_start
+from .graph import HOURS_PER_DAY
+from .models import Employee, Task, TimeEntry
+
+HOURS_PER_WEEK = HOURS_PER_DAY * 5
+# Task statuses whose estimated hours are still to be worked
+OPEN_STATUSES = ('backlog', 'pending', 'in_progress', 'in_review')
+
+
+def _grouped(queryset, employee_field, date_field, hours_field):
+    return queryset.order_by().annotate(week=TruncWeek(date_field)).values(employee_field, 'week').annotate(
+        hours=models.Sum(hours_field)
+    ).values_list(employee_field, 'week', 'hours')
+
+
+def _matrix(rows, employee_index, week_index):
+    matrix = [[0.0] * len(week_index) for _ in employee_index]
+    for employee_id, week, hours in rows:
+        matrix[employee_index[employee_id]][week_index[week]] = float(hours or Decimal(0))
+    return matrix
+
+
+def capacity(start, end, team=None):
+    """
+    Return planned and logged hours per employee (rows) and week (columns)
+    for the weeks from ``start`` to ``end``, optionally only for the
+    members of ``team`` who had not left it before ``start``, with the
+    totals of every row and column.
+    """
+    start, end = period_start(start, 'week'), period_start(end, 'week')
+    employees = Employee.objects.filter(is_active=True)
+    if team is not None:
+        # One filter() call so that both conditions apply to the same membership
+        employees = employees.filter(
+            models.Q(teammembership__left_date__isnull=True) | models.Q(teammembership__left_date__gte=start),
+            teammembership__team=team,
+        )
+    employees = list(employees.order_by('user__first_name', 'user__last_name', 'pk').values_list(
+        'pk', 'user__username', 'user__first_name', 'user__last_name'
+    ))
+    employee_ids = [pk for pk, *_ in employees]
+    weeks = [start + datetime.timedelta(weeks=i) for i in range((end - start).days // 7 + 1)]
+    range_end = end + datetime.timedelta(days=6)
+
+    planned = _grouped(
+        Task.objects.filter(
+            assigned_to__in=employee_ids, status__in=OPEN_STATUSES, due_date__range=(start, range_end)
+        ),
+        'assigned_to', 'due_date', 'estimated_hours',
+    )
+    logged = _grouped(
+        TimeEntry.objects.filter(employee__in=employee_ids, date__range=(start, range_end)),
+        'employee', 'date', 'hours_spent',
+    )
+    employee_index = {pk: i for i, pk in enumerate(employee_ids)}
+    week_index = {week: i for i, week in enumerate(weeks)}
+    planned = _matrix(planned, employee_index, week_index)
+    logged = _matrix(logged, employee_index, week_index)
+
+    return {
+        'weeks': [week.isoformat() for week in weeks],
+        'hours_per_week': HOURS_PER_WEEK,
+        'employees': [
+            {'id': pk, 'username': username, 'name': f'{first_name} {last_name}'.strip()}
+            for pk, username, first_name, last_name in employees
+        ],
+        'planned': planned,
+        'logged': logged,
+        'planned_per_employee': [sum(row) for row in planned],
+        'logged_per_employee': [sum(row) for row in logged],
+        'planned_per_week': [sum(column) for column in zip(*planned)] or [0.0] * len(weeks),
+        'logged_per_week': [sum(column) for column in zip(*logged)] or [0.0] * len(weeks),
+    }
@@ -0,0 +1,106 @@
+import hashlib
+
+from django.core.exceptions import ValidationError
+from django.db.models import Count, Max
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework import serializers
+
+
+def rendered_models(serializer):
+    """Yield the model of every serializer nested in ``serializer``, at any depth"""
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.ModelSerializer):
+            yield field.Meta.model
+            yield from rendered_models(field)
+
+
+class ConditionalGetMixin:
+    """
+    Answers ``If-None-Match`` and ``If-Modified-Since`` on ``list`` and
+    ``retrieve`` with ``304 Not Modified`` before any serialization work.
+
+    The validators come from one aggregate query over the filtered
+    queryset: the latest ``updated_at`` and the row count, plus the latest
+    value and row count of every relation in ``conditional_related_fields``
+    whose data the serializer reads (e.g. ``stats__updated_at``). Counts
+    catch deletions, which leave no timestamp behind. Many-to-many links
+    have no timestamp either, so ``core.signals`` touches the rows whose
+    links change.
+
+    ``Last-Modified`` only comes with details that read no related rows:
+    deleting a row or unlinking a related one cannot move the latest
+    timestamp, so only the ETag, whose counts change, reflects it.
+
+    Responses that nest a model without ``updated_at``, such as the user
+    inside ``EmployeeSerializer``, cannot be validated this way and are
+    served without validators, as are keyset pages, which would otherwise
+    pay for the whole-table aggregate their pagination exists to avoid.
+    """
+    conditional_related_fields = ()
+
+    def get_conditional_related_fields(self):
+        return self.conditional_related_fields
+
+    def get_validators(self, queryset):
+        aggregates = {'last_modified': Max('updated_at'), 'count': Count('pk', distinct=True)}
+        for index, field in enumerate(self.get_conditional_related_fields()):
+            relation = field.rsplit('__', 1)[0]
+            aggregates[f'related_modified_{index}'] = Max(field)
+            aggregates[f'related_count_{index}'] = Count(relation, distinct=True)
+        return queryset.order_by().aggregate(**aggregates)
+
+    def get_etag(self, request, validators):
+        # Responses differ per page, filter, user and renderer as well as per data
+        key = repr((
+            sorted(validators.items()), request.get_full_path(),
+            getattr(request.user, 'pk', None), request.accepted_media_type,
+        ))
+        return quote_etag(hashlib.md5(key.encode()).hexdigest())
+
+    def get_last_modified(self, validators):
+        if self.action != 'retrieve' or self.get_conditional_related_fields():
+            return None
+        timestamps = [value for name, value in validators.items() if 'modified' in name and value is not None]
+        return int(max(timestamps).timestamp()) if timestamps else None
+
+    def conditional_supported(self):
+        """Whether every model the serializer nests has an ``updated_at`` to validate"""
+        return all(
+            any(field.name == 'updated_at' for field in model._meta.concrete_fields)
+            for model in rendered_models(self.get_serializer())
+        )
+
+    def conditional_response(self, request, queryset, handler, *args, **kwargs):
+        if not self.conditional_supported():
+            return handler(request, *args, **kwargs)
+        validators = self.get_validators(queryset)
+        etag = self.get_etag(request, validators)
+        last_modified = self.get_last_modified(validators)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            if last_modified is not None:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if getattr(self.paginator, 'cursor_query_param', None) in request.query_params:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        return self.conditional_response(request, queryset, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            queryset = self.filter_queryset(self.get_queryset()).filter(
+                **{self.lookup_field: self.kwargs[lookup_url_kwarg]}
+            )
+        except (TypeError, ValueError, ValidationError):
+            # Malformed lookups get their 404 from get_object()
+            return super().retrieve(request, *args, **kwargs)
+        return self.conditional_response(request, queryset, super().retrieve, *args, **kwargs)
@@ -0,0 +1,75 @@
+"""
+Streaming exports.
+
+Rows are read from the database with a chunked iterator and written to
+the response as they are produced, so memory stays flat no matter how
+many rows are exported.
+"""
+import csv
+import datetime
+import json
+from decimal import Decimal
+
+from django.http import StreamingHttpResponse
+
+CHUNK_SIZE = 2000
+
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+class _Echo:
+    """File-like object whose ``write`` hands the line back to ``csv.writer``"""
+
+    def write(self, value):
+        return value
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def csv_lines(columns, rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def ndjson_lines(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), default=_json_default) + '\n'
+
+
+def streaming_export(columns, rows, file_format, filename):
+    """Return a ``StreamingHttpResponse`` writing ``rows`` as CSV or NDJSON"""
+    lines = csv_lines(columns, rows) if file_format == 'csv' else ndjson_lines(columns, rows)
+    response = StreamingHttpResponse(lines, content_type=CONTENT_TYPES[file_format])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{file_format}"'
+    return response
+
+
+TIME_ENTRY_COLUMNS = (
+    'id', 'date', 'employee_id', 'username', 'first_name', 'last_name', 'hourly_rate',
+    'hours_spent', 'cost', 'task_id', 'task', 'project_id', 'project', 'description',
+)
+
+
+def time_entry_rows(queryset):
+    """Yield payroll rows for ``queryset`` with employee, task and project joined in the same query"""
+    values = queryset.values_list(
+        'id', 'date', 'employee_id', 'employee__user__username', 'employee__user__first_name',
+        'employee__user__last_name', 'employee__hourly_rate', 'hours_spent', 'task_id', 'task__title',
+        'task__project_id', 'task__project__name', 'description',
+    )
+    for (pk, date, employee_id, username, first_name, last_name, hourly_rate, hours_spent,
+         task_id, task, project_id, project, description) in values.iterator(chunk_size=CHUNK_SIZE):
+        cost = (hours_spent * hourly_rate).quantize(Decimal('0.01')) if hourly_rate is not None else None
+        yield (pk, date, employee_id, username, first_name, last_name, hourly_rate, hours_spent, cost,
+               task_id, task, project_id, project, description)
@@ -0,0 +1,181 @@
+"""
+List pages serialized straight from ``values_list()`` rows.
+
+``ModelSerializer`` builds a model instance per row and then walks every
+field through ``get_attribute`` and ``to_representation``. For flat
+serializers, whose fields each read one column or the primary keys of a
+many-to-many field, ``compile_serializer`` works out once which column
+every field reads and whether DRF reformats its value (dates, decimals).
+Rows are then rendered from plain tuples, calling a converter only where
+one is needed, and come out identical to the serializer's output.
+Serializers with any other kind of field are not compiled and the view
+falls back to them.
+
+Each serializer class is compiled once, untrimmed, in a bounded cache of
+``FAST_LIST_COMPILE_CACHE_SIZE`` classes; ``?fields=`` selections reuse
+its fields rather than adding entries. Set ``FAST_LIST_ENABLED = False``,
+or ``fast_list = False`` on a view, to serve lists through the serializer,
+e.g. to rule the compiled path out when comparing output.
+"""
+import functools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+# Fields whose to_representation() returns database values unchanged
+PASSTHROUGH_FIELDS = {
+    serializers.BooleanField, serializers.CharField, serializers.ChoiceField, serializers.EmailField,
+    serializers.IntegerField, serializers.JSONField, PrimaryKeyRelatedField,
+}
+# Fields whose to_representation() formats the database value
+CONVERTED_FIELDS = {
+    serializers.BigIntegerField, serializers.DateField, serializers.DateTimeField, serializers.DecimalField,
+    serializers.FloatField,
+}
+
+ENABLED = getattr(settings, 'FAST_LIST_ENABLED', True)
+COMPILE_CACHE_SIZE = getattr(settings, 'FAST_LIST_COMPILE_CACHE_SIZE', 64)
+
+
+def _model_field(opts, source):
+    try:
+        return opts.get_field(source)
+    except FieldDoesNotExist:
+        return None
+
+
+class CompiledSerializer:
+    """Renders rows of ``columns`` (primary key first) as the serializer it was compiled from would"""
+
+    def __init__(self, model, columns, fields, relations):
+        self.model = model
+        self.columns = columns
+        # (name, column index or None for many-to-many fields, converter or None)
+        self.fields = fields
+        # {name: ManyToManyField}
+        self.relations = relations
+
+    def rows(self, queryset):
+        """Turn ``queryset`` into named rows, keeping the columns pagination orders by"""
+        opts = self.model._meta
+        columns = list(self.columns)
+        for name in queryset.query.order_by or opts.ordering:
+            field = _model_field(opts, name.lstrip('-')) if isinstance(name, str) else None
+            if field is not None and field.concrete and field.attname not in columns:
+                columns.append(field.attname)
+        return queryset.prefetch_related(None).values_list(*columns, named=True)
+
+    def related_ids(self, ids):
+        """Return ``{name: {pk: [related pks]}}`` with one query per many-to-many field"""
+        related = {}
+        for name, model_field in self.relations.items():
+            source, target = model_field.m2m_field_name(), model_field.m2m_reverse_field_name()
+            ordering = [
+                f'-{target}__{order[1:]}' if order.startswith('-') else f'{target}__{order}'
+                for order in model_field.related_model._meta.ordering
+            ]
+            edges = model_field.remote_field.through.objects.filter(**{f'{source}__in': ids}).order_by(
+                *ordering, f'{target}__pk'
+            ).values_list(f'{source}_id', f'{target}_id')
+            related[name] = by_pk = {pk: [] for pk in ids}
+            for pk, related_pk in edges:
+                by_pk[pk].append(related_pk)
+        return related
+
+    def serialize(self, rows):
+        rows = list(rows)
+        related = self.related_ids([row[0] for row in rows]) if self.relations else {}
+        data = []
+        for row in rows:
+            item = {}
+            for name, index, convert in self.fields:
+                if index is None:
+                    item[name] = related[name][row[0]]
+                    continue
+                value = row[index]
+                item[name] = convert(value) if convert is not None and value is not None else value
+            data.append(item)
+        return data
+
+
+def compile_serializer(serializer):
+    """Return a ``CompiledSerializer`` equivalent to ``serializer``, or None if it has unsupported fields"""
+    entries = _compile(type(serializer))
+    if entries is None:
+        return None
+    model, entries = entries
+    opts = model._meta
+    columns, fields, relations = [opts.pk.attname], [], {}
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        # Fields that trimming replaced, e.g. unexpanded nested ones, are not compiled
+        if name not in entries or entries[name][0] is not type(field):
+            return None
+        _, model_field, convert = entries[name]
+        if isinstance(model_field, models.ManyToManyField):
+            relations[name] = model_field
+            fields.append((name, None, None))
+            continue
+        if model_field.attname not in columns:
+            columns.append(model_field.attname)
+        fields.append((name, columns.index(model_field.attname), convert))
+    return CompiledSerializer(model, columns, fields, relations)
+
+
+@functools.lru_cache(maxsize=COMPILE_CACHE_SIZE)
+def _compile(serializer_class):
+    """Return ``(model, {name: (field class, model field, converter or None)})`` or None"""
+    serializer = serializer_class()
+    model = serializer.Meta.model
+    opts = model._meta
+    entries = {}
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        model_field = _model_field(opts, field.source)
+        if model_field is None:
+            return None
+        if isinstance(field, ManyRelatedField):
+            child = field.child_relation
+            if type(child) is not PrimaryKeyRelatedField or child.pk_field is not None:
+                return None
+            if not isinstance(model_field, models.ManyToManyField):
+                return None
+            entries[name] = (type(field), model_field, None)
+            continue
+        if not model_field.concrete or model_field.many_to_many:
+            return None
+        if type(field) in PASSTHROUGH_FIELDS:
+            if getattr(field, 'binary', False) or getattr(field, 'pk_field', None) is not None:
+                return None
+            convert = None
+        elif type(field) in CONVERTED_FIELDS:
+            convert = field.to_representation
+        else:
+            return None
+        entries[name] = (type(field), model_field, convert)
+    return model, entries
+
+
+class FastListMixin:
+    """
+    Serves ``list`` through a compiled serializer whenever the view's
+    serializer can be compiled and ``fast_list`` is set, and through the
+    serializer otherwise.
+    """
+    fast_list = ENABLED
+
+    def list(self, request, *args, **kwargs):
+        compiled = compile_serializer(self.get_serializer()) if self.fast_list else None
+        if compiled is None:
+            return super().list(request, *args, **kwargs)
+        queryset = compiled.rows(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(compiled.serialize(page))
+        return Response(compiled.serialize(queryset))
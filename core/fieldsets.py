@@ -0,0 +1,99 @@
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+def _names(value):
+    return [name for name in value.split(',') if name] if value else []
+
+
+class SparseFieldsetMixin:
+    """
+    Lets ``list`` and ``retrieve`` clients trim their responses.
+
+    ``?fields=a,b`` keeps only these fields and ``?exclude=a,b`` drops them.
+    ``?expand=x,y`` keeps only the listed nested relations nested and
+    renders the others as primary keys; without it the serializer nests
+    as usual. The columns no remaining field reads are left out of the
+    SELECT with ``only()``, and ``get_queryset`` implementations ask
+    ``field_requested``/``field_expanded`` before adding joins and
+    prefetches.
+    """
+    sparse_actions = ('list', 'retrieve')
+
+    def get_fieldset(self):
+        """Return ``(fields, exclude, expand)`` with ``None`` for absent parameters, or None if not trimmed"""
+        if not hasattr(self, '_fieldset'):
+            params = self.request.query_params
+            fields, exclude, expand = (_names(params.get(name)) for name in ('fields', 'exclude', 'expand'))
+            if self.action not in self.sparse_actions or not (fields or exclude or expand):
+                self._fieldset = None
+            else:
+                self._fieldset = (fields or None, set(exclude), set(expand) if expand else None)
+        return self._fieldset
+
+    def field_requested(self, name):
+        fieldset = self.get_fieldset()
+        if fieldset is None:
+            return True
+        fields, exclude, _ = fieldset
+        return (fields is None or name in fields) and name not in exclude
+
+    def field_expanded(self, name):
+        fieldset = self.get_fieldset()
+        return self.field_requested(name) and (fieldset is None or fieldset[2] is None or name in fieldset[2])
+
+    def apply_fieldset(self, serializer):
+        """Drop the unrequested fields of ``serializer`` and turn unexpanded nested ones into primary keys"""
+        fields, exclude, expand = self.get_fieldset()
+        declared = serializer.fields
+        nested = {name for name, field in declared.items() if isinstance(field, serializers.BaseSerializer)}
+        unknown = sorted((set(fields or ()) | exclude) - declared.keys())
+        if unknown:
+            raise ValidationError({'fields': [f'Unknown field: {name}' for name in unknown]})
+        if expand is not None and expand - nested:
+            raise ValidationError({'expand': [f'Cannot expand: {name}' for name in sorted(expand - nested)]})
+
+        for name in list(declared):
+            if not self.field_requested(name):
+                del declared[name]
+            elif name in nested and not self.field_expanded(name):
+                field = declared[name]
+                source = field.source if field.source != name else None
+                declared[name] = serializers.PrimaryKeyRelatedField(
+                    read_only=True, many=isinstance(field, serializers.ListSerializer), source=source
+                )
+        return serializer
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.get_fieldset() is not None:
+            self.apply_fieldset(getattr(serializer, 'child', serializer))
+        return serializer
+
+    def get_select_columns(self, queryset):
+        """Model fields the trimmed serializer reads, plus what ordering and ``select_related`` need"""
+        opts = queryset.model._meta
+        names = {opts.pk.name}
+        for field in self.get_serializer().fields.values():
+            names.add(field.source.split('.')[0])
+        names.update(
+            name.lstrip('-') for name in queryset.query.order_by or opts.ordering if isinstance(name, str)
+        )
+        names.update(queryset.query.select_related or ())
+
+        columns = []
+        for name in names:
+            try:
+                field = opts.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.append(field.name)
+        return columns
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        if self.get_fieldset() is None or queryset.query.select_related is True:
+            return queryset
+        return queryset.only(*self.get_select_columns(queryset))
@@ -0,0 +1,203 @@
+"""
+Dependency graphs of tasks and test cases.
+
+``DependencyGraph`` keeps dependencies in index-based arrays: item ``i``
+has the id ``ids[i]`` and the items depending on it are
+``targets[offsets[i]:offsets[i + 1]]``. ``TaskGraph.for_project`` loads a
+project's tasks and their dependency edges into one with a query each;
+dependencies on tasks of other projects are left out.
+
+Schedules are measured in working hours from the project start, counting
+``HOURS_PER_DAY`` hours per calendar day. A task takes its
+``estimated_hours`` and must finish by the end of its ``due_date``; a
+negative slack means it cannot.
+"""
+from array import array
+from collections import deque
+from itertools import accumulate
+
+from .models import Task
+
+HOURS_PER_DAY = 8
+
+
+class CycleError(Exception):
+    """The dependencies contain ``cycle``, a list of ids whose first and last item are the same"""
+
+    def __init__(self, cycle):
+        self.cycle = cycle
+        super().__init__('Dependencies form a cycle: ' + ' -> '.join(str(pk) for pk in cycle))
+
+
+class DependencyGraph:
+    """Dependencies between arbitrary ids, stored as compressed adjacency arrays"""
+
+    def __init__(self, ids, edges):
+        """``edges`` are ``(id, id it depends on)`` pairs; pairs naming unknown ids are ignored"""
+        self.ids = array('q', ids)
+        self.index = index = {pk: i for i, pk in enumerate(ids)}
+        pairs = sorted(
+            (index[dependency], index[item]) for item, dependency in edges
+            if item in index and dependency in index
+        )
+        counts = [0] * (len(ids) + 1)
+        for source, _ in pairs:
+            counts[source + 1] += 1
+        self.offsets = array('q', accumulate(counts))
+        self.targets = array('q', (target for _, target in pairs))
+
+    def __len__(self):
+        return len(self.ids)
+
+    def successors(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def topological_order(self):
+        """Return indexes with every item after its dependencies, or raise ``CycleError``"""
+        in_degree = array('q', bytes(8 * len(self)))
+        for target in self.targets:
+            in_degree[target] += 1
+        queue = deque(i for i in range(len(self)) if not in_degree[i])
+        order = []
+        while queue:
+            i = queue.popleft()
+            order.append(i)
+            for target in self.successors(i):
+                in_degree[target] -= 1
+                if not in_degree[target]:
+                    queue.append(target)
+        if len(order) < len(self):
+            raise CycleError(self._find_cycle({i for i in range(len(self)) if in_degree[i]}))
+        return order
+
+    def _find_cycle(self, remaining):
+        # Every item left over by Kahn's algorithm has a dependency among the
+        # others, so walking dependencies backwards must eventually repeat
+        dependency = {}
+        for i in remaining:
+            for target in self.successors(i):
+                if target in remaining:
+                    dependency[target] = i
+        path, seen = [], {}
+        i = next(iter(remaining))
+        while i not in seen:
+            seen[i] = len(path)
+            path.append(i)
+            i = dependency[i]
+        cycle = path[seen[i]:] + [i]
+        return [self.ids[i] for i in cycle]
+
+    def topological_ids(self):
+        return [self.ids[i] for i in self.topological_order()]
+
+    def dependents(self, ids):
+        """Return the ids of everything that depends on any of ``ids``, directly or transitively"""
+        queue = deque(self.index[pk] for pk in ids if pk in self.index)
+        seen = set(queue)
+        while queue:
+            for target in self.successors(queue.popleft()):
+                if target not in seen:
+                    seen.add(target)
+                    queue.append(target)
+        return {self.ids[i] for i in seen} - set(ids)
+
+
+class TaskGraph(DependencyGraph):
+    """Dependency graph of tasks with their durations and due dates"""
+
+    def __init__(self, ids, durations, due_dates, edges):
+        super().__init__(ids, edges)
+        self.durations = array('d', durations)
+        self.due_dates = due_dates
+
+    @classmethod
+    def for_project(cls, project_id):
+        tasks = Task.objects.filter(project_id=project_id).order_by('pk').values_list(
+            'pk', 'estimated_hours', 'due_date'
+        )
+        ids, durations, due_dates = [], [], []
+        for pk, estimated_hours, due_date in tasks:
+            ids.append(pk)
+            durations.append(float(estimated_hours or 0))
+            due_dates.append(due_date)
+        edges = Task.dependencies.through.objects.filter(
+            from_task__project_id=project_id, to_task__project_id=project_id
+        ).values_list('from_task_id', 'to_task_id')
+        return cls(ids, durations, due_dates, edges)
+
+    def schedule(self, start_date):
+        """
+        Run the critical path method from ``start_date``. Per-task values are
+        parallel lists in topological order.
+        """
+        order = self.topological_order()
+        durations = self.durations
+        earliest_start = [0.0] * len(self)
+        earliest_finish = [0.0] * len(self)
+        driver = [-1] * len(self)
+        for i in order:
+            finish = earliest_finish[i] = earliest_start[i] + durations[i]
+            for target in self.successors(i):
+                if finish > earliest_start[target]:
+                    earliest_start[target] = finish
+                    driver[target] = i
+        duration = max(earliest_finish, default=0.0)
+
+        latest_finish = [
+            min(duration, ((due_date - start_date).days + 1) * HOURS_PER_DAY) for due_date in self.due_dates
+        ]
+        latest_start = [0.0] * len(self)
+        for i in reversed(order):
+            for target in self.successors(i):
+                if latest_start[target] < latest_finish[i]:
+                    latest_finish[i] = latest_start[target]
+            latest_start[i] = latest_finish[i] - durations[i]
+
+        # The chain of dependencies that determines the earliest finish of the project
+        critical_path = []
+        i = max(range(len(self)), key=earliest_finish.__getitem__, default=-1)
+        while i != -1:
+            critical_path.append(self.ids[i])
+            i = driver[i]
+        critical_path.reverse()
+
+        return {
+            'start_date': start_date,
+            'hours_per_day': HOURS_PER_DAY,
+            'duration_hours': duration,
+            'critical_path': critical_path,
+            'order': [self.ids[i] for i in order],
+            'earliest_start': [earliest_start[i] for i in order],
+            'earliest_finish': [earliest_finish[i] for i in order],
+            'latest_start': [latest_start[i] for i in order],
+            'latest_finish': [latest_finish[i] for i in order],
+            'slack': [latest_start[i] - earliest_start[i] for i in order],
+        }
+
+
+def find_dependency_cycle(task_id, dependency_ids):
+    """
+    Return the cycle that making ``task_id`` depend on ``dependency_ids``
+    would create, or None. Walks the dependencies of every project with
+    one query per level.
+    """
+    through = Task.dependencies.through
+    if task_id in dependency_ids:
+        return [task_id, task_id]
+    parents = dict.fromkeys(dependency_ids)
+    frontier = set(parents)
+    while frontier:
+        edges = through.objects.filter(from_task_id__in=frontier).values_list('from_task_id', 'to_task_id')
+        frontier = set()
+        for from_id, to_id in edges:
+            if to_id in parents:
+                continue
+            parents[to_id] = from_id
+            if to_id == task_id:
+                chain = []
+                while from_id is not None:
+                    chain.append(from_id)
+                    from_id = parents[from_id]
+                return [task_id, *reversed(chain), task_id]
+            frontier.add(to_id)
+    return None
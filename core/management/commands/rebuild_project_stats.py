@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import ProjectStats
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the ProjectStats rollup from tasks and time entries, or verify it with --verify'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help='Only these projects (default: all)')
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Report rollup values that are out of date without changing them',
+        )
+
+    def handle(self, *args, **options):
+        project_ids = options['project_ids'] or None
+
+        if options['verify']:
+            mismatches = ProjectStats.objects.verify(project_ids)
+            for project_id, field, stored, expected in mismatches:
+                self.stdout.write(f'Project {project_id}: {field} is {stored}, expected {expected}')
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} rollup values are out of date')
+            self.stdout.write(self.style.SUCCESS('Project stats are up to date'))
+            return
+
+        ProjectStats.objects.refresh(project_ids)
+        self.stdout.write(self.style.SUCCESS('Project stats rebuilt'))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Recreate the full-text search tables and triggers and reindex their content'
+
+    def add_arguments(self, parser):
+        parser.add_argument('labels', nargs='*', help='Model labels such as core.Task (default: all)')
+        parser.add_argument('--database', default='default', help='Database alias to rebuild')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        labels = options['labels'] or None
+        search.uninstall_indexes(connection, labels)
+        search.install_indexes(connection, labels)
+        self.stdout.write(self.style.SUCCESS('Search indexes rebuilt'))
@@ -0,0 +1,71 @@
+# Generated by Django 5.1.15 on 2026-10-17 01:55
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def populate_project_stats(apps, schema_editor):
+    Project = apps.get_model('core', 'Project')
+    ProjectStats = apps.get_model('core', 'ProjectStats')
+    TimeEntry = apps.get_model('core', 'TimeEntry')
+    today = timezone.now().date()
+    projects = Project.objects.annotate(
+        total_tasks=models.Count('tasks'),
+        completed_tasks=models.Count('tasks', filter=models.Q(tasks__status='completed')),
+        overdue_tasks=models.Count('tasks', filter=models.Q(
+            tasks__due_date__lt=today, tasks__status__in=['pending', 'in_progress']
+        )),
+    )
+    sums = {
+        row['task__project']: row
+        for row in TimeEntry.objects.order_by().values('task__project').annotate(
+            hours_logged=models.Sum('hours_spent'),
+            cost=models.Sum(
+                models.F('hours_spent') * Coalesce('employee__hourly_rate', Decimal('0')),
+                output_field=models.DecimalField(max_digits=14, decimal_places=2),
+            ),
+        )
+    }
+    ProjectStats.objects.bulk_create([
+        ProjectStats(
+            project_id=project.pk,
+            total_tasks=project.total_tasks,
+            completed_tasks=project.completed_tasks,
+            overdue_tasks=project.overdue_tasks,
+            overdue_as_of=today,
+            hours_logged=Decimal(sums.get(project.pk, {}).get('hours_logged') or 0).quantize(Decimal('0.01')),
+            cost=Decimal(sums.get(project.pk, {}).get('cost') or 0).quantize(Decimal('0.01')),
+        )
+        for project in projects
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectStats',
+            fields=[
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='core.project')),
+                ('total_tasks', models.PositiveIntegerField(default=0)),
+                ('completed_tasks', models.PositiveIntegerField(default=0)),
+                ('overdue_tasks', models.PositiveIntegerField(default=0)),
+                ('overdue_as_of', models.DateField(blank=True, null=True)),
+                ('hours_logged', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Project stats',
+            },
+        ),
+        migrations.RunPython(populate_project_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+from django.db import migrations
+
+# Tables, primary key and text columns indexed by this migration, frozen
+# here so that later changes to core.search do not alter its effect.
+SEARCH_INDEXES = {
+    'core_task': ('id', ['title', 'description']),
+    'core_comment': ('id', ['content']),
+}
+
+
+def fts5_supported(connection):
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('PRAGMA compile_options')
+        return ('ENABLE_FTS5',) in cursor.fetchall()
+
+
+def install_fts5(schema_editor, table, pk, names):
+    """Create the FTS5 external-content index of ``table`` and the triggers that sync it, also used by pm"""
+    qn = schema_editor.connection.ops.quote_name
+    fts = f'{table}_fts'
+    columns = ', '.join(qn(name) for name in names)
+    new = ', '.join(f'new.{qn(name)}' for name in names)
+    old = ', '.join(f'old.{qn(name)}' for name in names)
+    schema_editor.execute(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts)} USING fts5("
+        f"{columns}, content={qn(table)}, content_rowid={qn(pk)}, tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ai')} AFTER INSERT ON {qn(table)} BEGIN "
+        f"INSERT INTO {qn(fts)}(rowid, {columns}) VALUES (new.{qn(pk)}, {new}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ad')} AFTER DELETE ON {qn(table)} BEGIN "
+        f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {columns}) VALUES ('delete', old.{qn(pk)}, {old}); END"
+    )
+    schema_editor.execute(
+        f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_au')} AFTER UPDATE OF {columns} ON {qn(table)} BEGIN "
+        f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {columns}) VALUES ('delete', old.{qn(pk)}, {old}); "
+        f"INSERT INTO {qn(fts)}(rowid, {columns}) VALUES (new.{qn(pk)}, {new}); END"
+    )
+    schema_editor.execute(f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')")
+
+
+def uninstall_fts5(schema_editor, table):
+    qn = schema_editor.connection.ops.quote_name
+    fts = f'{table}_fts'
+    for suffix in ('_ai', '_ad', '_au'):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS {qn(fts + suffix)}')
+    schema_editor.execute(f'DROP TABLE IF EXISTS {qn(fts)}')
+
+
+def install_search_indexes(apps, schema_editor):
+    if fts5_supported(schema_editor.connection):
+        for table, (pk, names) in SEARCH_INDEXES.items():
+            install_fts5(schema_editor, table, pk, names)
+
+
+def uninstall_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for table in SEARCH_INDEXES:
+            uninstall_fts5(schema_editor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_projectstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_indexes, uninstall_search_indexes),
+    ]
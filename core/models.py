@@ -1,9 +1,14 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce , TruncWeek
 from django.utils import timezone
+from decimal import Decimal
 import datetime
 
+from .response_cache import bump_generation
+
 
 class TimeStampedModel(models.Model):
     """Abstract base class with created and modified timestamps"""
@@ -14,6 +19,28 @@ class TimeStampedModel(models.Model):
         abstract = True
 
 
+class VersionedQuerySet(models.QuerySet):
+    """
+    Invalidates cached API responses on bulk writes, which bypass the
+    signals in ``core.signals``. Updates also stamp ``updated_at`` the way
+    ``save()`` does so that conditional GETs notice them.
+    """
+
+    def update(self , **kwargs):
+        if issubclass(self.model , TimeStampedModel):
+            kwargs.setdefault('updated_at' , timezone.now())
+        rows = super().update(**kwargs)
+        if rows:
+            bump_generation(self.model)
+        return rows
+
+    def bulk_create(self , objs , *args , **kwargs):
+        objs = super().bulk_create(objs , *args , **kwargs)
+        if objs:
+            bump_generation(self.model)
+        return objs
+
+
 class Employee(TimeStampedModel):
     user = models.OneToOneField(User , on_delete=models.CASCADE)
     position = models.CharField(max_length=100)
@@ -25,6 +52,8 @@ class Employee(TimeStampedModel):
     is_active = models.BooleanField(default=True)
     profile_image = models.ImageField(upload_to='employee_profiles/' , null=True , blank=True)
 
+    objects = VersionedQuerySet.as_manager()
+
     def __str__(self):
         return self.user.get_full_name()
 
@@ -32,6 +61,19 @@ class Employee(TimeStampedModel):
         ordering = ['user__first_name' , 'user__last_name']
 
 
+class TeamQuerySet(VersionedQuerySet):
+    def with_counts(self):
+        """Annotate member and active project counts"""
+        return self.annotate(
+            members_count=models.Count('members' , distinct=True) ,
+            active_projects_count=models.Count(
+                'projects' ,
+                filter=models.Q(projects__status__in=['not_started' , 'in_progress']) ,
+                distinct=True
+            )
+        )
+
+
 class Team(TimeStampedModel):
     name = models.CharField(max_length=100)
     description = models.TextField(blank=True)
@@ -44,6 +86,8 @@ class Team(TimeStampedModel):
     )
     is_active = models.BooleanField(default=True)
 
+    objects = TeamQuerySet.as_manager()
+
     def __str__(self):
         return self.name
 
@@ -58,10 +102,37 @@ class TeamMembership(TimeStampedModel):
     joined_date = models.DateField(default=timezone.now)
     left_date = models.DateField(null=True , blank=True)
 
+    objects = VersionedQuerySet.as_manager()
+
     class Meta:
         unique_together = ('team' , 'employee')
 
 
+class ProjectQuerySet(VersionedQuerySet):
+    def with_task_counts(self):
+        """Annotate total, completed and overdue task counts from the ProjectStats rollup"""
+        today = timezone.now().date()
+        overdue = Task.objects.filter(
+            project=models.OuterRef('pk') ,
+            due_date__lt=today ,
+            status__in=Task.OVERDUE_STATUSES
+        ).order_by().values('project').annotate(count=models.Count('pk')).values('count')
+        return self.annotate(
+            total_tasks=Coalesce('stats__total_tasks' , 0) ,
+            completed_tasks=Coalesce('stats__completed_tasks' , 0) ,
+            # Overdue counts go stale at midnight, so count live until the rollup is refreshed
+            overdue_tasks=models.Case(
+                models.When(stats__overdue_as_of=today , then='stats__overdue_tasks') ,
+                default=Coalesce(models.Subquery(overdue) , 0)
+            )
+        )
+
+    def bulk_create(self , objs , *args , **kwargs):
+        objs = super().bulk_create(objs , *args , **kwargs)
+        ProjectStats.objects.refresh([obj.pk for obj in objs if obj.pk])
+        return objs
+
+
 class Project(TimeStampedModel):
     STATUS_CHOICES = [
         ('not_started' , 'Not Started') ,
@@ -94,6 +165,8 @@ class Project(TimeStampedModel):
     tags = models.JSONField(default=list , blank=True)
     is_archived = models.BooleanField(default=False)
 
+    objects = ProjectQuerySet.as_manager()
+
     def clean(self):
         if self.end_date and self.start_date and self.end_date < self.start_date:
             raise ValidationError('End date cannot be before start date')
@@ -109,6 +182,51 @@ class Project(TimeStampedModel):
         ordering = ['-start_date' , 'name']
 
 
+class TaskQuerySet(VersionedQuerySet):
+    # Fields that feed the ProjectStats rollup
+    ROLLUP_FIELDS = {'project' , 'project_id' , 'status' , 'due_date'}
+
+    # Depth limit of subtree(), which also stops parent_task cycles from recursing forever
+    MAX_TREE_DEPTH = 1000
+
+    def subtree(self , task_id , max_depth=None):
+        """Filter to a task and all of its descendants through ``parent_task`` with a recursive CTE"""
+        table = self.model._meta.db_table
+        tree = RawSQL(
+            f'WITH RECURSIVE tree (id, depth) AS ('
+            f'SELECT id, 0 FROM "{table}" WHERE id = %s '
+            f'UNION SELECT child.id, tree.depth + 1 FROM "{table}" child '
+            f'JOIN tree ON child.parent_task_id = tree.id WHERE tree.depth < %s'
+            f') SELECT id FROM tree' ,
+            [task_id , min(max_depth if max_depth is not None else self.MAX_TREE_DEPTH , self.MAX_TREE_DEPTH)]
+        )
+        return self.filter(pk__in=tree)
+
+    def with_time_logged(self):
+        """Annotate the total hours logged against each task"""
+        hours = TimeEntry.objects.filter(task=models.OuterRef('pk')).order_by().values('task').annotate(
+            total=models.Sum('hours_spent')
+        ).values('total')
+        return self.annotate(time_logged=models.Subquery(hours))
+
+    def bulk_create(self , objs , *args , **kwargs):
+        objs = super().bulk_create(objs , *args , **kwargs)
+        ProjectStats.objects.refresh({obj.project_id for obj in objs})
+        return objs
+
+    def update(self , **kwargs):
+        if not self.ROLLUP_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        # Bulk updates bypass signals, so refresh the projects touched before and after
+        project_ids = set(self.order_by().values_list('project_id' , flat=True).distinct())
+        rows = super().update(**kwargs)
+        project = kwargs.get('project' , kwargs.get('project_id'))
+        if project is not None:
+            project_ids.add(getattr(project , 'pk' , project))
+        ProjectStats.objects.refresh(project_ids)
+        return rows
+
+
 class Task(TimeStampedModel):
     STATUS_CHOICES = [
         ('backlog' , 'Backlog') ,
@@ -118,6 +236,8 @@ class Task(TimeStampedModel):
         ('completed' , 'Completed') ,
         ('cancelled' , 'Cancelled')
     ]
+    # Open statuses that make a task overdue once its due date has passed
+    OVERDUE_STATUSES = ['pending' , 'in_progress']
 
     project = models.ForeignKey(Project , on_delete=models.CASCADE , related_name="tasks")
     parent_task = models.ForeignKey(
@@ -143,6 +263,8 @@ class Task(TimeStampedModel):
     dependencies = models.ManyToManyField('self' , blank=True , symmetrical=False)
     attachments = models.JSONField(default=list , blank=True)
 
+    objects = TaskQuerySet.as_manager()
+
     def clean(self):
         if self.due_date and self.due_date < self.project.start_date:
             raise ValidationError('Task due date cannot be before project start date')
@@ -160,6 +282,14 @@ class Task(TimeStampedModel):
 
     class Meta:
         ordering = ['due_date' , 'priority']
+        indexes = [
+            # TaskViewSet filters and ProjectQuerySet.with_task_counts() overdue counts
+            models.Index(fields=['project' , 'status' , 'due_date' , 'priority'] , name='task_project_status_due_idx') ,
+            models.Index(fields=['assigned_to' , 'status' , 'due_date' , 'priority'] , name='task_assignee_status_due_idx') ,
+            models.Index(fields=['status' , 'due_date' , 'priority'] , name='task_status_due_idx') ,
+            # Default ordering, including the id tiebreaker of keyset pages
+            models.Index(fields=['due_date' , 'priority' , 'id'] , name='task_due_priority_idx') ,
+        ]
 
 
 class Comment(TimeStampedModel):
@@ -168,11 +298,58 @@ class Comment(TimeStampedModel):
     content = models.TextField()
     attachments = models.JSONField(default=list , blank=True)
 
+    objects = VersionedQuerySet.as_manager()
+
     def __str__(self):
         return f'Comment by {self.author} on {self.task}'
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['task' , '-created_at'] , name='comment_task_created_idx') ,
+        ]
+
+
+class TimeEntryQuerySet(VersionedQuerySet):
+    # Fields that feed the ProjectStats rollup
+    ROLLUP_FIELDS = {'task' , 'task_id' , 'employee' , 'employee_id' , 'hours_spent'}
+
+    def project_ids(self):
+        return set(self.order_by().values_list('task__project_id' , flat=True).distinct())
+
+    @staticmethod
+    def cost_sum():
+        """Aggregate of hours spent priced at each employee's current hourly rate"""
+        return models.Sum(
+            models.F('hours_spent') * Coalesce('employee__hourly_rate' , Decimal('0')) ,
+            output_field=models.DecimalField(max_digits=14 , decimal_places=2)
+        )
+
+    def cost_by_period(self , interval='day'):
+        """Return ``(period start, cost)`` pairs in date order from one grouped query"""
+        period = TruncWeek('date') if interval == 'week' else models.F('date')
+        return self.order_by().annotate(period=period).values('period').annotate(
+            cost=self.cost_sum()
+        ).order_by('period').values_list('period' , 'cost')
+
+    def bulk_create(self , objs , *args , **kwargs):
+        objs = super().bulk_create(objs , *args , **kwargs)
+        task_ids = {obj.task_id for obj in objs}
+        ProjectStats.objects.refresh(
+            set(Task.objects.filter(pk__in=task_ids).values_list('project_id' , flat=True))
+        )
+        return objs
+
+    def update(self , **kwargs):
+        if not self.ROLLUP_FIELDS & kwargs.keys():
+            return super().update(**kwargs)
+        # Bulk updates bypass signals, so refresh the projects touched before and after
+        pks = list(self.values_list('pk' , flat=True))
+        project_ids = self.project_ids()
+        rows = super().update(**kwargs)
+        project_ids |= TimeEntry.objects.filter(pk__in=pks).project_ids()
+        ProjectStats.objects.refresh(project_ids)
+        return rows
 
 
 class TimeEntry(TimeStampedModel):
@@ -182,6 +359,8 @@ class TimeEntry(TimeStampedModel):
     hours_spent = models.DecimalField(max_digits=5 , decimal_places=2)
     description = models.TextField(blank=True)
 
+    objects = TimeEntryQuerySet.as_manager()
+
     def clean(self):
         if self.hours_spent <= 0:
             raise ValidationError('Hours spent must be greater than 0')
@@ -197,4 +376,119 @@ class TimeEntry(TimeStampedModel):
 
     class Meta:
         ordering = ['-date']
-        verbose_name_plural = 'Time entries'
\ No newline at end of file
+        verbose_name_plural = 'Time entries'
+        indexes = [
+            # Non-superusers only see their own entries, newest first
+            models.Index(fields=['employee' , '-date'] , name='timeentry_employee_date_idx') ,
+            models.Index(fields=['task' , '-date'] , name='timeentry_task_date_idx') ,
+            models.Index(fields=['-date' , 'id'] , name='timeentry_date_idx') ,
+        ]
+
+
+class ProjectStatsQuerySet(VersionedQuerySet):
+    COUNT_FIELDS = ('total_tasks' , 'completed_tasks' , 'overdue_tasks')
+    SUM_FIELDS = ('hours_logged' , 'cost')
+
+    def compute(self , project_ids=None):
+        """Return fresh rollup values keyed by project id, computed with two grouped queries"""
+        today = timezone.now().date()
+        projects = Project.objects.all()
+        tasks = Task.objects.all()
+        entries = TimeEntry.objects.all()
+        if project_ids is not None:
+            projects = projects.filter(pk__in=project_ids)
+            tasks = tasks.filter(project__in=project_ids)
+            entries = entries.filter(task__project__in=project_ids)
+
+        stats = {
+            pk: dict.fromkeys(self.COUNT_FIELDS , 0) | dict.fromkeys(self.SUM_FIELDS , Decimal('0.00'))
+            for pk in projects.values_list('pk' , flat=True)
+        }
+        task_counts = tasks.order_by().values('project').annotate(
+            total_tasks=models.Count('pk') ,
+            completed_tasks=models.Count('pk' , filter=models.Q(status='completed')) ,
+            overdue_tasks=models.Count(
+                'pk' ,
+                filter=models.Q(due_date__lt=today , status__in=Task.OVERDUE_STATUSES)
+            )
+        )
+        for row in task_counts:
+            if row['project'] in stats:
+                stats[row['project']].update({field: row[field] for field in self.COUNT_FIELDS})
+        hour_sums = entries.order_by().values('task__project').annotate(
+            hours_logged=models.Sum('hours_spent') ,
+            cost=TimeEntryQuerySet.cost_sum()
+        )
+        for row in hour_sums:
+            if row['task__project'] in stats:
+                stats[row['task__project']].update({
+                    field: Decimal(row[field] or 0).quantize(Decimal('0.01')) for field in self.SUM_FIELDS
+                })
+        return stats
+
+    def refresh(self , project_ids=None):
+        """Recompute and store the rollup of the given projects, or of every project"""
+        if project_ids is not None:
+            project_ids = [pk for pk in project_ids if pk is not None]
+            if not project_ids:
+                return
+        today = timezone.now().date()
+        rows = [
+            ProjectStats(project_id=pk , overdue_as_of=today , **values)
+            for pk , values in self.compute(project_ids).items()
+        ]
+        self.bulk_create(
+            rows ,
+            update_conflicts=True ,
+            unique_fields=['project'] ,
+            update_fields=[*self.COUNT_FIELDS , *self.SUM_FIELDS , 'overdue_as_of' , 'updated_at'] ,
+            batch_size=500
+        )
+
+    def apply_delta(self , project_id , **deltas):
+        """Add ``deltas`` to a project's rollup, recomputing it if the row is missing or stale"""
+        updates = {field: models.F(field) + value for field , value in deltas.items() if value}
+        if not updates:
+            return
+        # The overdue count is only valid for the day it was computed on
+        updated = self.filter(project_id=project_id , overdue_as_of=timezone.now().date()).update(
+            updated_at=timezone.now() , **updates
+        )
+        if not updated:
+            self.refresh([project_id])
+
+    def verify(self , project_ids=None):
+        """Return ``(project_id, field, stored, expected)`` for every rollup value out of date"""
+        today = timezone.now().date()
+        stored = {stats.pk: stats for stats in self.filter(
+            **({} if project_ids is None else {'project__in': project_ids})
+        )}
+        mismatches = []
+        for pk , expected in self.compute(project_ids).items():
+            stats = stored.get(pk)
+            for field , value in expected.items():
+                if field == 'overdue_tasks' and stats and stats.overdue_as_of != today:
+                    continue
+                actual = getattr(stats , field) if stats else None
+                if actual != value:
+                    mismatches.append((pk , field , actual , value))
+        return mismatches
+
+
+class ProjectStats(TimeStampedModel):
+    """Task and time rollups of a project, kept up to date by ``core.signals``"""
+    project = models.OneToOneField(Project , on_delete=models.CASCADE , primary_key=True , related_name='stats')
+    total_tasks = models.PositiveIntegerField(default=0)
+    completed_tasks = models.PositiveIntegerField(default=0)
+    overdue_tasks = models.PositiveIntegerField(default=0)
+    overdue_as_of = models.DateField(null=True , blank=True)
+    hours_logged = models.DecimalField(max_digits=12 , decimal_places=2 , default=0)
+    cost = models.DecimalField(max_digits=14 , decimal_places=2 , default=0)
+
+    objects = ProjectStatsQuerySet.as_manager()
+
+    def __str__(self):
+        return f'Stats for {self.project}'
+
+    class Meta:
+        verbose_name_plural = 'Project stats'
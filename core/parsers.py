@@ -0,0 +1,36 @@
+import codecs
+import csv
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+
+def _decoded_lines(stream, parser_context):
+    encoding = (parser_context or {}).get('encoding', settings.DEFAULT_CHARSET)
+    return codecs.iterdecode(stream, encoding)
+
+
+class CSVParser(BaseParser):
+    """Lazily parses a CSV body with a header row into one dict per row"""
+    media_type = 'text/csv'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return csv.DictReader(_decoded_lines(stream, parser_context))
+
+
+class NDJSONParser(BaseParser):
+    """Lazily parses newline delimited JSON into one object per line"""
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        def rows():
+            for number, line in enumerate(_decoded_lines(stream, parser_context), start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError as exc:
+                    raise ParseError(f'NDJSON parse error on line {number} - {exc}')
+        return rows()
@@ -0,0 +1,57 @@
+"""
+API renderers.
+
+``FastJSONRenderer`` encodes with orjson when it is installed and falls
+back to DRF's stdlib encoder otherwise, for indented output (the
+browsable API) and for values orjson cannot encode, such as integers
+beyond 64 bits. Types orjson does not know, including ``Decimal`` and
+datetimes, go through DRF's encoder, so both paths produce the same
+bytes.
+
+``MessagePackRenderer`` answers ``Accept: application/msgpack`` when the
+msgpack package is installed, with the same values as the JSON.
+"""
+from rest_framework import renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+_encoder = encoders.JSONEncoder()
+
+
+class FastJSONRenderer(renderers.JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if orjson is None or indent is not None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            # Datetimes are passed to DRF's encoder, which shortens microseconds the way clients expect
+            ret = orjson.dumps(
+                data, default=_encoder.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            )
+        except orjson.JSONEncodeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Like JSONRenderer, escape the separators JavaScript does not allow in strings
+        return ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+
+
+class MessagePackRenderer(renderers.BaseRenderer):
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=_encoder.default, use_bin_type=True)
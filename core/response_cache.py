@@ -0,0 +1,136 @@
+"""
+Versioned cache of API responses.
+
+Every model has a generation counter in the cache that is bumped whenever
+one of its rows is written: from ``core.signals`` for single objects and
+from ``VersionedQuerySet`` for bulk writes, which send no signals.
+Responses are cached under the generations of every model the view reads,
+so a write makes older entries unreachable instead of deleting them, and
+the cache backend's LRU eviction reclaims them.
+
+Generations are bumped again when the transaction commits, so a response
+computed by another request from data read before the commit cannot be
+cached under the new generation.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+from rest_framework.response import Response
+
+CACHE_ALIAS = getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')
+CACHE_TIMEOUT = getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 60 * 60)
+KEY_PREFIX = 'response-cache'
+# Response headers stored alongside the data
+CACHED_HEADERS = ('ETag', 'Last-Modified')
+
+
+def get_cache():
+    return caches[CACHE_ALIAS]
+
+
+def _increment(cache, key, initial):
+    if cache.add(key, initial, timeout=None):
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr()
+        cache.add(key, initial, timeout=None)
+
+
+def generation_key(model):
+    return f'{KEY_PREFIX}:generation:{model._meta.label_lower}'
+
+
+def bump_generation(*models):
+    """Invalidate the cached responses that read any of ``models``"""
+    keys = {generation_key(model) for model in models}
+
+    def bump():
+        cache = get_cache()
+        for key in keys:
+            # Evicted counters restart from the clock, never from a value
+            # that older cached responses might still be keyed by
+            _increment(cache, key, time.time_ns())
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def cache_stats():
+    """Return the number of cache hits and misses since the last ``reset_stats()``"""
+    values = get_cache().get_many([f'{KEY_PREFIX}:hits', f'{KEY_PREFIX}:misses'])
+    return {
+        'hits': values.get(f'{KEY_PREFIX}:hits', 0),
+        'misses': values.get(f'{KEY_PREFIX}:misses', 0),
+    }
+
+
+def reset_stats():
+    get_cache().delete_many([f'{KEY_PREFIX}:hits', f'{KEY_PREFIX}:misses'])
+
+
+class CachedResponseMixin:
+    """
+    Caches the data of ``list`` and ``retrieve`` responses per user and
+    their active, staff and superuser flags, path, query string and media
+    type. ``cache_models`` lists the models the
+    serializers read besides the queryset's own; a write to any of them
+    invalidates the view's entries. Responses carry ``X-Cache: HIT`` or
+    ``MISS``, and cached ``ETag``/``Last-Modified`` validators still
+    answer conditional requests with 304.
+    """
+    cache_models = ()
+
+    def get_cache_models(self):
+        return [self.queryset.model, *self.cache_models]
+
+    def get_cache_key(self, request):
+        keys = [generation_key(model) for model in self.get_cache_models()]
+        generations = get_cache().get_many(keys)
+        # The date is part of the key because overdue counts roll over at midnight
+        variant = repr((
+            [generations.get(key) for key in keys], request.get_full_path(),
+            request.accepted_media_type, timezone.now().date(),
+        ))
+        # Querysets may depend on the user's flags as well as on who they are
+        user = request.user
+        user = f"{getattr(user, 'pk', None)}:{int(user.is_active)}{int(user.is_staff)}{int(user.is_superuser)}"
+        return f'{KEY_PREFIX}:response:{self.basename}:{user}:{hashlib.md5(variant.encode()).hexdigest()}'
+
+    def cached_response(self, request, handler, *args, **kwargs):
+        cache = get_cache()
+        key = self.get_cache_key(request)
+        cached = cache.get(key)
+        if cached is not None:
+            _increment(cache, f'{KEY_PREFIX}:hits', 1)
+            data, headers = cached
+            response = get_conditional_response(
+                request, etag=headers.get('ETag'), last_modified=parse_http_date_safe(headers.get('Last-Modified'))
+            )
+            if response is None:
+                response = Response(data)
+            for header, value in headers.items():
+                response[header] = value
+            response['X-Cache'] = 'HIT'
+            return response
+
+        _increment(cache, f'{KEY_PREFIX}:misses', 1)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == 200 and isinstance(response, Response):
+            headers = {header: response[header] for header in CACHED_HEADERS if header in response}
+            cache.set(key, (response.data, headers), CACHE_TIMEOUT)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(request, super().retrieve, *args, **kwargs)
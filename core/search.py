@@ -0,0 +1,221 @@
+"""
+Full-text search for tasks, comments and test cases.
+
+Each database vendor gets a ``SearchBackend``. On SQLite the text columns
+listed in ``SEARCH_INDEXES`` are mirrored into FTS5 external-content
+tables that triggers keep in sync, so bulk writes stay indexed too. Other
+databases fall back to ``LikeSearchBackend`` until a backend is
+registered for them with ``register_backend``.
+
+Django drops the triggers when it rebuilds a SQLite table during a schema
+migration, so ``repair_indexes`` reinstalls missing ones and reindexes
+their table after every ``migrate``. ``manage.py rebuild_search_index``
+recreates the indexes from scratch.
+"""
+import re
+
+from django.apps import apps
+from django.db import connections
+from django.db.models import Q, Value, FloatField
+from django.db.models.expressions import RawSQL
+from rest_framework import filters
+
+# Indexed text columns per model with their BM25 ranking weights
+SEARCH_INDEXES = {
+    'core.Task': {'title': 10.0, 'description': 1.0},
+    'core.Comment': {'content': 1.0},
+    'pm.TestCase': {'title': 10.0, 'description': 1.0},
+}
+
+
+def search_columns(model):
+    return SEARCH_INDEXES.get(model._meta.label, {})
+
+
+class SearchBackend:
+    """Interface for full-text search on one database vendor"""
+
+    def is_supported(self, connection):
+        return True
+
+    def install(self, connection, model):
+        """Create whatever the backend needs to search ``model``"""
+
+    def uninstall(self, connection, model):
+        """Drop what ``install`` created"""
+
+    def repair(self, connection, model):
+        """Restore what a schema change may have dropped from an installed index"""
+
+    def matches(self, model, term):
+        """Return a ``Q`` object selecting the rows of ``model`` that match ``term``"""
+        raise NotImplementedError
+
+    def ranked(self, queryset, term):
+        """Return the rows of ``queryset`` that match ``term`` with a ``search_rank`` to order by, best first"""
+        return queryset.filter(self.matches(queryset.model, term)).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+
+class LikeSearchBackend(SearchBackend):
+    """Portable fallback: every word must appear in one of the indexed columns"""
+
+    def matches(self, model, term):
+        condition = Q()
+        for word in term.split():
+            word_condition = Q()
+            for column in search_columns(model):
+                word_condition |= Q(**{f'{column}__icontains': word})
+            condition &= word_condition
+        return condition
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    """SQLite FTS5 external-content tables with BM25 ranking and prefix matching"""
+
+    def is_supported(self, connection):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA compile_options')
+            return ('ENABLE_FTS5',) in cursor.fetchall()
+
+    @staticmethod
+    def table_name(model):
+        return f'{model._meta.db_table}_fts'
+
+    def install(self, connection, model):
+        qn = connection.ops.quote_name
+        table = model._meta.db_table
+        fts = self.table_name(model)
+        pk = model._meta.pk.column
+        columns = ', '.join(qn(column) for column in search_columns(model))
+        new = ', '.join(f'new.{qn(column)}' for column in search_columns(model))
+        old = ', '.join(f'old.{qn(column)}' for column in search_columns(model))
+        statements = [
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {qn(fts)} USING fts5("
+            f"{columns}, content={qn(table)}, content_rowid={qn(pk)}, tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ai')} AFTER INSERT ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}(rowid, {columns}) VALUES (new.{qn(pk)}, {new}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_ad')} AFTER DELETE ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {columns}) VALUES ('delete', old.{qn(pk)}, {old}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {qn(fts + '_au')} AFTER UPDATE OF {columns} ON {qn(table)} BEGIN "
+            f"INSERT INTO {qn(fts)}({qn(fts)}, rowid, {columns}) VALUES ('delete', old.{qn(pk)}, {old}); "
+            f"INSERT INTO {qn(fts)}(rowid, {columns}) VALUES (new.{qn(pk)}, {new}); END",
+            f"INSERT INTO {qn(fts)}({qn(fts)}) VALUES ('rebuild')",
+        ]
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+
+    def repair(self, connection, model):
+        fts = self.table_name(model)
+        names = [fts] + [fts + suffix for suffix in ('_ai', '_ad', '_au')]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT name FROM sqlite_master WHERE name IN ({', '.join(['%s'] * len(names))})", names
+            )
+            existing = {name for name, in cursor.fetchall()}
+        # Leave uninstalled indexes alone, e.g. after migrating back past their migration
+        if fts in existing and len(existing) < len(names):
+            self.install(connection, model)
+
+    def uninstall(self, connection, model):
+        qn = connection.ops.quote_name
+        fts = self.table_name(model)
+        with connection.cursor() as cursor:
+            for suffix in ('_ai', '_ad', '_au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {qn(fts + suffix)}')
+            cursor.execute(f'DROP TABLE IF EXISTS {qn(fts)}')
+
+    @staticmethod
+    def build_query(term):
+        """Turn user input into an FTS5 query where every word is a quoted prefix"""
+        words = re.findall(r'\w+', term)
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def matches(self, model, term):
+        query = self.build_query(term)
+        if not query:
+            return Q(pk__in=[])
+        fts = self.table_name(model)
+        return Q(pk__in=RawSQL(f'SELECT rowid FROM "{fts}" WHERE "{fts}" MATCH %s', [query]))
+
+    def ranked(self, queryset, term):
+        query = self.build_query(term)
+        if not query:
+            return queryset.none()
+        model = queryset.model
+        fts = self.table_name(model)
+        weights = ', '.join(str(weight) for weight in search_columns(model).values())
+        pk = f'"{model._meta.db_table}"."{model._meta.pk.column}"'
+        # Joining the index once lets bm25() score the rows MATCH already found
+        return queryset.extra(
+            select={'search_rank': f'bm25("{fts}", {weights})'},
+            tables=[fts],
+            where=[f'"{fts}".rowid = {pk}', f'"{fts}" MATCH %s'],
+            params=[query],
+        )
+
+
+BACKENDS = {
+    'sqlite': SQLiteFTS5Backend,
+}
+
+
+def register_backend(vendor, backend_class):
+    BACKENDS[vendor] = backend_class
+
+
+def get_search_backend(using='default'):
+    connection = connections[using]
+    backend_class = BACKENDS.get(connection.vendor)
+    if backend_class is not None:
+        backend = backend_class()
+        if backend.is_supported(connection):
+            return backend
+    return LikeSearchBackend()
+
+
+def install_indexes(connection, labels=None):
+    """Create the search index of each model label, e.g. from a migration"""
+    backend = get_search_backend(connection.alias)
+    for label in labels or SEARCH_INDEXES:
+        backend.install(connection, apps.get_model(label))
+
+
+def uninstall_indexes(connection, labels=None):
+    backend = get_search_backend(connection.alias)
+    for label in labels or SEARCH_INDEXES:
+        backend.uninstall(connection, apps.get_model(label))
+
+
+def repair_indexes(connection, labels=None):
+    """Reinstall the parts of installed search indexes that schema migrations dropped"""
+    backend = get_search_backend(connection.alias)
+    for label in labels or SEARCH_INDEXES:
+        backend.repair(connection, apps.get_model(label))
+
+
+def repair_indexes_after_migrate(using, **kwargs):
+    """``post_migrate`` receiver for ``repair_indexes``"""
+    repair_indexes(connections[using])
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    ``SearchFilter`` that answers from the full-text index when the request
+    asks for ``search_mode=fulltext``, ordering matches by relevance unless
+    an explicit ordering or a keyset cursor is requested.
+    """
+    search_mode_param = 'search_mode'
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.search_mode_param) != 'fulltext':
+            return super().filter_queryset(request, queryset, view)
+        term = ' '.join(self.get_search_terms(request))
+        if not term:
+            return queryset
+        backend = get_search_backend(queryset.db)
+        if 'cursor' in request.query_params:
+            return queryset.filter(backend.matches(queryset.model, term))
+        return backend.ranked(queryset, term).order_by('search_rank', 'pk')
@@ -2,8 +2,14 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Employee , Team , TeamMembership , Project , Task , Comment , TimeEntry
 from django.db import models
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.utils import timezone
 from rest_framework import serializers
 from django.contrib.auth.models import User
+import copy
+import datetime
+
+from .graph import CycleError , find_dependency_cycle
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -51,10 +57,17 @@ class TeamSerializer(serializers.ModelSerializer):
         read_only_fields = ('id' , 'created_at' , 'updated_at')
 
     def get_members_count(self , obj):
-        return obj.members.count()
+        # Prefer the counts annotated by TeamQuerySet.with_counts()
+        members_count = getattr(obj , 'members_count' , None)
+        if members_count is None:
+            members_count = obj.members.count()
+        return members_count
 
     def get_active_projects_count(self , obj):
-        return obj.projects.filter(status__in=['not_started' , 'in_progress']).count()
+        active_projects_count = getattr(obj , 'active_projects_count' , None)
+        if active_projects_count is None:
+            active_projects_count = obj.projects.filter(status__in=['not_started' , 'in_progress']).count()
+        return active_projects_count
 
 
 class TeamDetailSerializer(TeamSerializer):
@@ -72,14 +85,20 @@ class ProjectSerializer(serializers.ModelSerializer):
         read_only_fields = ('id' , 'created_at' , 'updated_at')
 
     def get_completion_percentage(self , obj):
-        total_tasks = obj.tasks.count()
+        total_tasks = self.get_task_count(obj)
         if total_tasks == 0:
             return 0
-        completed_tasks = obj.tasks.filter(status='completed').count()
+        # Prefer the counts annotated by ProjectQuerySet.with_task_counts()
+        completed_tasks = getattr(obj , 'completed_tasks' , None)
+        if completed_tasks is None:
+            completed_tasks = obj.tasks.filter(status='completed').count()
         return (completed_tasks / total_tasks) * 100
 
     def get_task_count(self , obj):
-        return obj.tasks.count()
+        total_tasks = getattr(obj , 'total_tasks' , None)
+        if total_tasks is None:
+            total_tasks = obj.tasks.count()
+        return total_tasks
 
 
 class ProjectDetailSerializer(ProjectSerializer):
@@ -93,20 +112,99 @@ class TaskSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id' , 'created_at' , 'updated_at')
 
+    def validate_dependencies(self , value):
+        # A new task has no dependents yet, so only updates can close a cycle
+        if self.instance is not None:
+            cycle = find_dependency_cycle(self.instance.pk , {task.pk for task in value})
+            if cycle:
+                raise serializers.ValidationError(str(CycleError(cycle)))
+        return value
+
 
 class TaskDetailSerializer(TaskSerializer):
     project = ProjectSerializer(read_only=True)
     assigned_to = EmployeeSerializer(read_only=True)
-    subtasks = serializers.SerializerMethodField()
+    subtasks = TaskSerializer(many=True , read_only=True)
     time_logged = serializers.SerializerMethodField()
 
-    def get_subtasks(self , obj):
-        return TaskSerializer(obj.subtasks.all() , many=True).data
-
     def get_time_logged(self , obj):
+        # Prefer the sum annotated by TaskQuerySet.with_time_logged()
+        if hasattr(obj , 'time_logged'):
+            return obj.time_logged or 0
         return obj.time_entries.aggregate(total_hours=models.Sum('hours_spent'))['total_hours'] or 0
 
 
+def _primary_key(value):
+    try:
+        return int(value)
+    except (TypeError , ValueError):
+        return None
+
+
+class PreloadedRelatedField(serializers.Field):
+    """Resolves a primary key from objects preloaded into the serializer context"""
+    default_error_messages = {
+        'does_not_exist': 'Invalid pk "{pk_value}" - object does not exist.' ,
+    }
+
+    def __init__(self , context_key , **kwargs):
+        self.context_key = context_key
+        super().__init__(**kwargs)
+
+    def to_internal_value(self , data):
+        obj = self.context[self.context_key].get(_primary_key(data))
+        if obj is None:
+            self.fail('does_not_exist' , pk_value=data)
+        return obj
+
+    def to_representation(self , value):
+        return value.pk
+
+
+class TaskBulkItemSerializer(TaskSerializer):
+    """
+    One item of a bulk task request. Related objects come from ``preload``
+    so that validating a batch runs a fixed number of queries; dependencies
+    are not supported in bulk.
+    """
+    project = PreloadedRelatedField('projects')
+    parent_task = PreloadedRelatedField('tasks' , required=False , allow_null=True)
+    assigned_to = PreloadedRelatedField('employees' , required=False , allow_null=True)
+
+    class Meta(TaskSerializer.Meta):
+        fields = None
+        exclude = ('dependencies' ,)
+
+    @staticmethod
+    def preload(items):
+        """Load every task, project and employee referenced by ``items`` with one query each"""
+        def referenced(key):
+            return {_primary_key(item.get(key)) for item in items if isinstance(item , dict)} - {None}
+
+        tasks = Task.objects.in_bulk(referenced('id') | referenced('parent_task'))
+        projects = Project.objects.in_bulk(referenced('project') | {task.project_id for task in tasks.values()})
+        for task in tasks.values():
+            task.project = projects[task.project_id]
+        employees = Employee.objects.in_bulk(referenced('assigned_to'))
+        return {'tasks': tasks , 'projects': projects , 'employees': employees}
+
+    @staticmethod
+    def get_instance(item , context):
+        """Return the preloaded task an item updates, or None"""
+        return context['tasks'].get(_primary_key(item.get('id')))
+
+    def validate(self , attrs):
+        # Run Task.clean() on the merged values; the project is already loaded
+        task = copy.copy(self.instance) if self.instance else Task()
+        for field , value in attrs.items():
+            setattr(task , field , value)
+        try:
+            task.clean()
+        except DjangoValidationError as e:
+            raise serializers.ValidationError(e.messages)
+        return attrs
+
+
 class CommentSerializer(serializers.ModelSerializer):
     class Meta:
         model = Comment
@@ -118,4 +216,23 @@ class TimeEntrySerializer(serializers.ModelSerializer):
     class Meta:
         model = TimeEntry
         fields = '__all__'
-        read_only_fields = ('id' , 'created_at' , 'updated_at')
\ No newline at end of file
+        read_only_fields = ('id' , 'created_at' , 'updated_at')
+
+class CapacityQuerySerializer(serializers.Serializer):
+    """Query parameters of the employee capacity matrix"""
+    team = serializers.PrimaryKeyRelatedField(queryset=Team.objects.all() , required=False)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+
+    # Largest range returned in one response
+    max_weeks = 104
+
+    def validate(self , attrs):
+        today = timezone.now().date()
+        attrs.setdefault('start' , today - datetime.timedelta(weeks=4))
+        attrs.setdefault('end' , attrs['start'] + datetime.timedelta(weeks=8))
+        if attrs['end'] < attrs['start']:
+            raise serializers.ValidationError('end must not be before start')
+        if (attrs['end'] - attrs['start']).days > self.max_weeks * 7:
+            raise serializers.ValidationError(f'The range cannot exceed {self.max_weeks} weeks')
+        return attrs
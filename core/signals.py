@@ -0,0 +1,202 @@
+"""
+Keep the ``ProjectStats`` rollup in step with writes to tasks, time
+entries and employee rates, reject task dependencies that would form a
+cycle, touch the tasks whose dependencies change, and invalidate cached API responses on every write to a ``core``
+model or user, and cached authenticated users on writes to the user.
+
+Single-object saves and deletes apply a delta to the affected project's
+rollup. Bulk ``QuerySet.update``/``bulk_create`` paths bypass these
+signals and refresh the touched projects from ``TaskQuerySet`` and
+``TimeEntryQuerySet`` instead.
+"""
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .authentication import user_cache
+from .graph import CycleError, find_dependency_cycle
+from .models import Employee, Project, ProjectStats, Task, Team, TimeEntry
+from .response_cache import bump_generation
+
+
+def _task_counts(status, due_date):
+    return {
+        'total_tasks': 1,
+        'completed_tasks': int(status == 'completed'),
+        'overdue_tasks': int(due_date < timezone.now().date() and status in Task.OVERDUE_STATUSES),
+    }
+
+
+def _time_sums(hours_spent, hourly_rate):
+    hours_spent = Decimal(hours_spent)
+    return {
+        'hours_logged': hours_spent,
+        'cost': (hours_spent * (hourly_rate or 0)).quantize(Decimal('0.01')),
+    }
+
+
+def _negate(values):
+    return {field: -value for field, value in values.items()}
+
+
+def _cascades_from_project(origin):
+    """Whether a delete was started by a project or team, taking the rollup down with it"""
+    model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return issubclass(model, (Project, Team))
+
+
+@receiver(post_save, sender=Project)
+def create_project_stats(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        ProjectStats.objects.refresh([instance.pk])
+
+
+@receiver(pre_save, sender=Task)
+def remember_task_rollup_values(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = Task.objects.filter(pk=instance.pk).values(
+            'project_id', 'status', 'due_date'
+        ).first()
+
+
+@receiver(post_save, sender=Task)
+def update_stats_for_task(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_rollup_previous', None)
+    current = _task_counts(instance.status, instance.due_date)
+    if previous is None:
+        ProjectStats.objects.apply_delta(instance.project_id, **current)
+    elif previous['project_id'] != instance.project_id:
+        # Hours logged against the task move along with it
+        ProjectStats.objects.refresh([previous['project_id'], instance.project_id])
+    else:
+        old = _task_counts(previous['status'], previous['due_date'])
+        ProjectStats.objects.apply_delta(
+            instance.project_id, **{field: current[field] - old[field] for field in current}
+        )
+
+
+@receiver(post_delete, sender=Task)
+def update_stats_for_deleted_task(sender, instance, origin=None, **kwargs):
+    if _cascades_from_project(origin):
+        return
+    ProjectStats.objects.apply_delta(
+        instance.project_id, **_negate(_task_counts(instance.status, instance.due_date))
+    )
+
+
+def _time_entry_rollup_values(task_id, employee_id):
+    project_id = Task.objects.filter(pk=task_id).values_list('project_id', flat=True).first()
+    hourly_rate = Employee.objects.filter(pk=employee_id).values_list('hourly_rate', flat=True).first()
+    return project_id, hourly_rate
+
+
+@receiver(pre_save, sender=TimeEntry)
+def remember_time_entry_rollup_values(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = TimeEntry.objects.filter(pk=instance.pk).values(
+            'task__project_id', 'hours_spent', 'employee__hourly_rate'
+        ).first()
+
+
+@receiver(post_save, sender=TimeEntry)
+def update_stats_for_time_entry(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    project_id, hourly_rate = _time_entry_rollup_values(instance.task_id, instance.employee_id)
+    current = _time_sums(instance.hours_spent, hourly_rate)
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is None:
+        ProjectStats.objects.apply_delta(project_id, **current)
+        return
+    old = _time_sums(previous['hours_spent'], previous['employee__hourly_rate'])
+    if previous['task__project_id'] != project_id:
+        ProjectStats.objects.apply_delta(previous['task__project_id'], **_negate(old))
+        ProjectStats.objects.apply_delta(project_id, **current)
+    else:
+        ProjectStats.objects.apply_delta(project_id, **{field: current[field] - old[field] for field in current})
+
+
+@receiver(post_delete, sender=TimeEntry)
+def update_stats_for_deleted_time_entry(sender, instance, origin=None, **kwargs):
+    if _cascades_from_project(origin):
+        return
+    project_id, hourly_rate = _time_entry_rollup_values(instance.task_id, instance.employee_id)
+    ProjectStats.objects.apply_delta(project_id, **_negate(_time_sums(instance.hours_spent, hourly_rate)))
+
+
+@receiver(pre_save, sender=Employee)
+def remember_hourly_rate(sender, instance, raw=False, **kwargs):
+    instance._rollup_previous = None
+    if instance.pk and not raw:
+        instance._rollup_previous = Employee.objects.filter(pk=instance.pk).values('hourly_rate').first()
+
+
+@receiver(post_save, sender=Employee)
+def update_stats_for_hourly_rate(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_rollup_previous', None)
+    if previous is None or previous['hourly_rate'] == instance.hourly_rate:
+        return
+    # Cost is computed at the current rate, so reprice every project the employee logged time on
+    ProjectStats.objects.refresh(TimeEntry.objects.filter(employee=instance).project_ids())
+
+
+@receiver(m2m_changed, sender=Task.dependencies.through)
+def prevent_dependency_cycles(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != 'pre_add' or not pk_set:
+        return
+    # Reverse adds make every task in pk_set depend on the instance
+    additions = [(pk, [instance.pk]) for pk in pk_set] if reverse else [(instance.pk, pk_set)]
+    for task_id, dependency_ids in additions:
+        cycle = find_dependency_cycle(task_id, set(dependency_ids))
+        if cycle:
+            raise ValidationError(str(CycleError(cycle)))
+
+
+@receiver(m2m_changed, sender=Task.dependencies.through)
+def touch_tasks_with_changed_dependencies(sender, instance, action, reverse, pk_set, **kwargs):
+    """Links carry no timestamp, so changing them touches the tasks whose dependencies they are"""
+    if action == 'pre_clear' and reverse:
+        # post_clear does not say which tasks lost the dependency
+        instance._cleared_dependents = list(Task.objects.filter(dependencies=instance).values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        task_ids = [instance.pk] if pk_set or action == 'post_clear' else []
+    elif action == 'post_clear':
+        task_ids = instance.__dict__.pop('_cleared_dependents', [])
+    else:
+        task_ids = pk_set
+    if task_ids:
+        Task.objects.filter(pk__in=task_ids).update(updated_at=timezone.now())
+
+
+def invalidate_responses(sender, **kwargs):
+    bump_generation(sender)
+
+
+def invalidate_responses_for_m2m(sender, instance, action, model, **kwargs):
+    if action.startswith('post_'):
+        bump_generation(sender, type(instance), model)
+
+
+for cached_model in [*apps.get_app_config('core').get_models(include_auto_created=True), get_user_model()]:
+    post_save.connect(invalidate_responses, sender=cached_model)
+    post_delete.connect(invalidate_responses, sender=cached_model)
+    m2m_changed.connect(invalidate_responses_for_m2m, sender=cached_model)
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    user_cache.discard(instance.pk)
@@ -1,3 +1,1250 @@
+import datetime
+import itertools
+import json
+import os
+import unittest
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.management import CommandError, call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection, transaction
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from . import benchmarks, fast_list, graph, renderers, response_cache, search, views
+from .authentication import UserCache, user_cache
+from .models import Employee, Team, TeamMembership, Project, ProjectStats, Task, Comment, TimeEntry
+from .serializers import ProjectSerializer, TaskSerializer, TimeEntrySerializer
+
+
+class APITestCase(TestCase):
+    """Base class providing an authenticated client and small model factories"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.employee = Employee.objects.create(user=cls.user, position='Engineer')
+        cls.team = Team.objects.create(name='Platform', team_lead=cls.employee)
+        cls.today = timezone.now().date()
+
+    def setUp(self):
+        # Cached responses and users outlive the rolled back data of earlier tests
+        response_cache.get_cache().clear()
+        user_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_project(self, name='Project', **kwargs):
+        kwargs.setdefault('description', name)
+        kwargs.setdefault('start_date', self.today - datetime.timedelta(days=30))
+        kwargs.setdefault('team', self.team)
+        kwargs.setdefault('project_manager', self.employee)
+        return Project.objects.create(name=name, **kwargs)
+
+    def create_task(self, project, title='Task', **kwargs):
+        kwargs.setdefault('description', title)
+        kwargs.setdefault('due_date', self.today)
+        return Task.objects.create(project=project, title=title, **kwargs)
+
+    def assertConstantQueries(self, url, grow):
+        """Assert that ``url`` runs the same number of queries after calling ``grow()``"""
+        with CaptureQueriesContext(connection) as before:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        grow()
+        with CaptureQueriesContext(connection) as after:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        self.assertEqual(len(before), len(after))
+
+
+class ProjectViewSetTests(APITestCase):
+    def create_projects(self, count):
+        for i in range(count):
+            project = self.create_project(f'Project {i}')
+            self.create_task(project, 'Done', status='completed')
+            self.create_task(project, 'Late', status='pending', due_date=self.today - datetime.timedelta(days=1))
+            self.create_task(project, 'Open', status='in_progress')
+
+    def test_list_query_count_is_constant(self):
+        self.create_projects(2)
+        self.assertConstantQueries('/api/projects/', lambda: self.create_projects(8))
+
+    def test_list_reports_task_counts(self):
+        self.create_projects(1)
+        row = self.client.get('/api/projects/').data['results'][0]
+        self.assertEqual(row['task_count'], 3)
+        self.assertAlmostEqual(row['completion_percentage'], 100 / 3)
+
+    def test_tasks_summary(self):
+        self.create_projects(1)
+        project = Project.objects.get()
+        response = self.client.get(f'/api/projects/{project.pk}/tasks_summary/')
+        self.assertEqual(response.data['total_tasks'], 3)
+        self.assertEqual(response.data['completed_tasks'], 1)
+        self.assertEqual(response.data['overdue_tasks'], 1)
+
+
+class TeamViewSetTests(APITestCase):
+    def create_members(self, team, count):
+        for i in range(count):
+            user = User.objects.create_user(f'{team.name}-{team.members.count()}-{i}')
+            employee = Employee.objects.create(user=user, position='Engineer')
+            TeamMembership.objects.create(team=team, employee=employee)
+
+    def grow(self):
+        team = Team.objects.create(name=f'Team {Team.objects.count()}', team_lead=self.employee)
+        self.create_members(team, 5)
+        self.create_members(self.team, 5)
+        self.create_project(team=team)
+
+    def test_list_query_count_is_constant(self):
+        self.create_members(self.team, 2)
+        self.assertConstantQueries('/api/teams/', self.grow)
+
+    def test_detail_query_count_is_constant(self):
+        self.create_members(self.team, 2)
+        self.assertConstantQueries(f'/api/teams/{self.team.pk}/', self.grow)
+
+    def test_counts(self):
+        self.create_members(self.team, 3)
+        self.create_project(status='in_progress')
+        self.create_project(status='completed')
+        response = self.client.get(f'/api/teams/{self.team.pk}/')
+        self.assertEqual(response.data['members_count'], 3)
+        self.assertEqual(response.data['active_projects_count'], 1)
+        self.assertEqual(len(response.data['members']), 3)
+
+
+class TaskViewSetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.create_project()
+        self.task = self.create_task(self.project, 'Parent', assigned_to=self.employee)
+
+    def grow(self):
+        for i in range(3):
+            subtask = self.create_task(self.project, f'Subtask {Task.objects.count()}', parent_task=self.task)
+            subtask.dependencies.add(self.task)
+            TimeEntry.objects.create(task=self.task, employee=self.employee, date=self.today, hours_spent=2)
+            Team.objects.create(name=f'Team {Team.objects.count()}').members.add(self.employee)
+
+    def test_detail_query_count_is_constant(self):
+        self.grow()
+        self.assertConstantQueries(f'/api/tasks/{self.task.pk}/', self.grow)
+
+    def test_list_query_count_is_constant(self):
+        self.grow()
+        self.assertConstantQueries('/api/tasks/', self.grow)
+
+    def test_detail_payload(self):
+        self.grow()
+        data = self.client.get(f'/api/tasks/{self.task.pk}/').data
+        self.assertEqual(data['time_logged'], 6)
+        self.assertEqual(len(data['subtasks']), 3)
+        self.assertEqual(data['subtasks'][0]['dependencies'], [self.task.pk])
+        self.assertEqual(data['project']['task_count'], 4)
+        self.assertEqual(len(data['assigned_to']['teams']), 3)
+
+
+class SparseFieldsetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.create_project()
+        self.task = self.create_task(self.project, 'Parent', assigned_to=self.employee)
+        self.subtask = self.create_task(self.project, 'Child', parent_task=self.task)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        return response, [query['sql'] for query in queries]
+
+    def test_fields_trim_serializer_and_select(self):
+        _, default = self.get('/api/tasks/')
+        response, queries = self.get('/api/tasks/?fields=id,title')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title'})
+        select = next(sql for sql in queries if 'LIMIT' in sql)
+        self.assertIn('"title"', select)
+        self.assertNotIn('"description"', select)
+        self.assertNotIn('"attachments"', select)
+        # Dependencies are not rendered, so they are not prefetched
+        self.assertEqual(len(queries), len(default) - 1)
+
+    def test_exclude(self):
+        default = self.client.get('/api/employees/').data['results'][0]
+        data = self.client.get('/api/employees/?exclude=address,skills').data['results'][0]
+        self.assertEqual(data, {key: value for key, value in default.items() if key not in ('address', 'skills')})
+
+    def test_expand_turns_other_relations_into_keys(self):
+        default = self.client.get(f'/api/tasks/{self.task.pk}/').data
+        response, queries = self.get(f'/api/tasks/{self.task.pk}/?expand=project')
+        data = response.data
+        self.assertEqual(data['project']['task_count'], default['project']['task_count'])
+        self.assertEqual(data['assigned_to'], self.employee.pk)
+        self.assertEqual(data['subtasks'], [self.subtask.pk])
+        self.assertFalse(any('auth_user' in sql for sql in queries))
+
+    def test_unknown_names_are_rejected(self):
+        self.assertEqual(self.client.get('/api/tasks/?fields=id,secret').status_code, 400)
+        self.assertEqual(self.client.get(f'/api/tasks/{self.task.pk}/?expand=title').status_code, 400)
+
+    def test_keyset_pages_with_sparse_fields(self):
+        for i in range(12):
+            self.create_task(self.project, f'Task {i}')
+        url, titles = '/api/tasks/?cursor=&fields=title', []
+        while url:
+            data = self.client.get(url).data
+            titles.extend(row['title'] for row in data['results'])
+            url = data['next']
+        self.assertEqual(sorted(titles), sorted(Task.objects.values_list('title', flat=True)))
+
+
+class FastListTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        project = self.create_project()
+        first = self.create_task(project, 'First', estimated_hours=Decimal('1.5'), attachments=[{'name': 'a.txt'}])
+        second = self.create_task(project, 'Second', parent_task=first, assigned_to=self.employee)
+        for i in range(3):
+            task = self.create_task(project, f'Task {i}', due_date=self.today + datetime.timedelta(days=i))
+            task.dependencies.add(first, second)
+            TimeEntry.objects.create(task=task, employee=self.employee, date=self.today, hours_spent=Decimal(i) + 1)
+
+    def assertSameAsSerializer(self, url, serializer_class, queryset):
+        response = self.client.get(url)
+        expected = serializer_class(queryset, many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({**response.data, 'results': expected}))
+
+    def test_task_list_matches_serializer(self):
+        self.assertSameAsSerializer('/api/tasks/', TaskSerializer, Task.objects.order_by('due_date', 'priority', 'pk'))
+
+    def test_time_entry_list_matches_serializer(self):
+        self.assertSameAsSerializer('/api/time-entries/', TimeEntrySerializer, TimeEntry.objects.order_by('-date', 'pk'))
+
+    def test_unsupported_serializers_are_not_compiled(self):
+        self.assertIsNone(fast_list.compile_serializer(ProjectSerializer()))
+        self.assertIsNotNone(fast_list.compile_serializer(TaskSerializer()))
+
+    def test_field_selections_share_one_compiled_serializer(self):
+        self.client.get('/api/tasks/')
+        cached = fast_list._compile.cache_info().currsize
+        for fields in ('id', 'id,title', 'title,due_date,dependencies', 'status,id'):
+            with self.subTest(fields):
+                response = self.client.get(f'/api/tasks/?fields={fields}')
+                expected = TaskSerializer(Task.objects.order_by('due_date', 'priority', 'pk'), many=True).data
+                names = fields.split(',')
+                self.assertEqual(response.data['results'], [{name: row[name] for name in names} for row in expected])
+        self.assertEqual(fast_list._compile.cache_info().currsize, cached)
+
+    def test_fast_list_can_be_switched_off(self):
+        with mock.patch.object(views.TaskViewSet, 'fast_list', False), \
+                mock.patch.object(fast_list, 'compile_serializer') as compile_serializer:
+            self.assertSameAsSerializer(
+                '/api/tasks/', TaskSerializer, Task.objects.order_by('due_date', 'priority', 'pk')
+            )
+        compile_serializer.assert_not_called()
+
+
+class RendererTests(APITestCase):
+    def assertRendersLikeDRF(self, data):
+        self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_matches_drf_json(self):
+        self.assertRendersLikeDRF({
+            'budget': Decimal('1234.50'),
+            'created_at': timezone.now(),
+            'due_date': self.today,
+            'title': 'Überprüfung \u2028 done',
+            1: [None, True, 2.5],
+        })
+
+    def test_falls_back_for_what_orjson_cannot_encode(self):
+        self.assertRendersLikeDRF({'big': 2 ** 70})
+        data = {'a': [1, 2]}
+        self.assertEqual(
+            renderers.FastJSONRenderer().render(data, 'application/json; indent=2'),
+            JSONRenderer().render(data, 'application/json; indent=2'),
+        )
+
+    @unittest.skipIf(renderers.msgpack is None, 'msgpack is not installed')
+    def test_message_pack_on_request(self):
+        project = self.create_project(budget=Decimal('100.00'))
+        response = self.client.get(f'/api/projects/{project.pk}/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(renderers.msgpack.unpackb(response.content)['budget'], '100.00')
+
+    @unittest.skipIf(renderers.msgpack is not None, 'msgpack is installed')
+    def test_message_pack_needs_msgpack(self):
+        response = self.client.get('/api/projects/', HTTP_ACCEPT='application/msgpack')
+        self.assertEqual(response.status_code, 406)
+
+    def test_json_is_the_default(self):
+        response = self.client.get('/api/projects/', HTTP_ACCEPT='*/*')
+        self.assertEqual(response['Content-Type'], 'application/json')
+
+
+class JWTAuthenticationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+
+    def user_queries(self, method, url, **kwargs):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, **kwargs)
+        return response, [query['sql'] for query in queries if 'FROM "auth_user"' in query['sql']]
+
+    def login(self):
+        return self.user_queries('post', '/api/auth/login/', data={'username': 'admin', 'password': 'password'})
+
+    def test_login_loads_the_user_once(self):
+        response, queries = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['user']['username'], 'admin')
+        self.assertIn('access', response.data)
+        self.assertEqual(len(queries), 1)
+
+    def test_requests_reuse_the_logged_in_user(self):
+        token = self.login()[0].data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        for _ in range(2):
+            response, queries = self.user_queries('get', '/api/tasks/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(queries, [])
+
+    def test_deactivated_user_is_rejected(self):
+        token = self.login()[0].data['access']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/tasks/').status_code, 401)
+
+    def test_cache_is_bounded_and_expires(self):
+        cache = UserCache(size=2, timeout=60)
+        for user_id in (1, 2, 3):
+            cache.set(user_id, user_id)
+        self.assertEqual((cache.get(1), cache.get(2), cache.get(3)), (None, 2, 3))
+        expired = UserCache(size=2, timeout=-1)
+        expired.set(1, 1)
+        self.assertIsNone(expired.get(1))
+
+    def test_user_loaded_before_an_invalidation_is_not_cached(self):
+        cache = UserCache(size=2, timeout=60)
+        generation = cache.generation
+        cache.discard(1)
+        cache.set(1, 'stale', generation)
+        self.assertIsNone(cache.get(1))
+
+
+class ProjectStatsTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee.hourly_rate = 40
+        self.employee.save()
+        self.project = self.create_project()
+        self.task = self.create_task(self.project, status='pending', due_date=self.today - datetime.timedelta(days=1))
+
+    def assertStatsUpToDate(self):
+        self.assertEqual(ProjectStats.objects.verify(), [])
+
+    def log_time(self, hours, task=None):
+        return TimeEntry.objects.create(task=task or self.task, employee=self.employee, date=self.today,
+                                        hours_spent=hours)
+
+    def test_task_writes(self):
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.total_tasks, stats.overdue_tasks), (1, 1))
+        self.task.status = 'completed'
+        self.task.save()
+        stats.refresh_from_db()
+        self.assertEqual((stats.completed_tasks, stats.overdue_tasks), (1, 0))
+        self.task.delete()
+        self.assertEqual(ProjectStats.objects.get(project=self.project).total_tasks, 0)
+        self.assertStatsUpToDate()
+
+    def test_time_entry_writes(self):
+        entry = self.log_time(2)
+        self.log_time('1.5')
+        entry.hours_spent = 3
+        entry.save()
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.hours_logged, stats.cost), (Decimal('4.50'), Decimal('180.00')))
+        entry.delete()
+        self.employee.hourly_rate = 100
+        self.employee.save()
+        self.assertEqual(ProjectStats.objects.get(project=self.project).cost, Decimal('150.00'))
+        self.assertStatsUpToDate()
+
+    def test_moving_task_between_projects(self):
+        self.log_time(2)
+        other = self.create_project('Other')
+        self.task.project = other
+        self.task.save()
+        self.assertEqual(ProjectStats.objects.get(project=other).hours_logged, 2)
+        self.assertStatsUpToDate()
+
+    def test_bulk_paths(self):
+        Task.objects.bulk_create([Task(project=self.project, title='Bulk', description='', due_date=self.today)])
+        TimeEntry.objects.bulk_create([TimeEntry(task=self.task, employee=self.employee, date=self.today,
+                                                 hours_spent=1)])
+        Task.objects.filter(project=self.project).update(status='completed', completion_percentage=100)
+        TimeEntry.objects.update(hours_spent=5)
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.total_tasks, stats.completed_tasks, stats.hours_logged), (2, 2, 5))
+        self.assertStatsUpToDate()
+
+    def test_deleting_project(self):
+        self.log_time(2)
+        self.project.delete()
+        self.assertFalse(ProjectStats.objects.exists())
+
+    def test_stale_overdue_count_is_recounted(self):
+        ProjectStats.objects.update(overdue_as_of=self.today - datetime.timedelta(days=1), overdue_tasks=0)
+        self.assertEqual(Project.objects.with_task_counts().get().overdue_tasks, 1)
+
+    def test_rebuild_command(self):
+        ProjectStats.objects.update(total_tasks=7)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_project_stats', '--verify', stdout=StringIO())
+        call_command('rebuild_project_stats', stdout=StringIO())
+        call_command('rebuild_project_stats', '--verify', stdout=StringIO())
+        self.assertEqual(ProjectStats.objects.get().total_tasks, 1)
+
+
+class TaskBulkTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.create_project(end_date=self.today + datetime.timedelta(days=30))
+
+    def items(self, count):
+        return [{'project': self.project.pk, 'title': f'Imported {i}', 'description': 'Imported',
+                 'due_date': str(self.today), 'assigned_to': self.employee.pk} for i in range(count)]
+
+    def test_create_and_update(self):
+        task = self.create_task(self.project)
+        response = self.client.post('/api/tasks/bulk/', self.items(2) + [{'id': task.pk, 'status': 'completed'}],
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertEqual(Task.objects.count(), 3)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'completed')
+        stats = ProjectStats.objects.get(project=self.project)
+        self.assertEqual((stats.total_tasks, stats.completed_tasks), (3, 1))
+
+    def test_query_count_is_constant(self):
+        def post(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/tasks/bulk/', self.items(count), format='json')
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+        self.assertEqual(post(5), post(50))
+
+    def test_per_item_errors_write_nothing(self):
+        items = self.items(3)
+        items[1]['due_date'] = str(self.today + datetime.timedelta(days=60))
+        items[2]['project'] = 0
+        response = self.client.post('/api/tasks/bulk/', items + [{'id': 0}], format='json')
+        self.assertEqual(response.status_code, 400)
+        errors = response.data['errors']
+        self.assertEqual(errors[0], {})
+        self.assertIn('non_field_errors', errors[1])
+        self.assertIn('project', errors[2])
+        self.assertIn('id', errors[3])
+        self.assertFalse(Task.objects.exists())
+
+    def test_rejects_non_list(self):
+        self.assertEqual(self.client.post('/api/tasks/bulk/', {}, format='json').status_code, 400)
+        for body in ('5', 'null', '"title"', '{"title": "Task"}'):
+            with self.subTest(body):
+                response = self.client.post('/api/tasks/bulk/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Task.objects.exists())
+
+
+class TimesheetTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee.hourly_rate = 10
+        self.employee.save()
+        self.project = self.create_project()
+        self.task = self.create_task(self.project)
+
+    def rows(self, count):
+        return [{'task': self.task.pk, 'date': str(self.today - datetime.timedelta(days=i % 5)), 'hours_spent': '1.5'}
+                for i in range(count)]
+
+    def test_json(self):
+        response = self.client.post('/api/time-entries/timesheet/', self.rows(3), format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(TimeEntry.objects.filter(employee=self.employee).count(), 3)
+        self.assertEqual(ProjectStats.objects.get(project=self.project).cost, Decimal('45.00'))
+
+    def test_csv(self):
+        body = 'task,date,hours_spent,description\n' + ''.join(
+            f'{row["task"]},{row["date"]},{row["hours_spent"]},"Work, mostly"\n' for row in self.rows(4)
+        )
+        response = self.client.post('/api/time-entries/timesheet/', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(TimeEntry.objects.filter(description='Work, mostly').count(), 4)
+
+    def test_ndjson(self):
+        body = '\n'.join(json.dumps(row) for row in self.rows(2))
+        response = self.client.post('/api/time-entries/timesheet/', body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+
+    def test_rejects_bodies_that_are_not_lists(self):
+        for body in ('5', 'null', '"task,date"', '{"task": 1}'):
+            with self.subTest(body):
+                response = self.client.post('/api/time-entries/timesheet/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(TimeEntry.objects.exists())
+
+    def test_query_count_is_constant(self):
+        def post(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/time-entries/timesheet/', self.rows(count), format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+        self.assertEqual(post(5), post(100))
+
+    def test_invalid_rows_roll_back(self):
+        rows = self.rows(4)
+        rows[1]['hours_spent'] = '0'
+        rows[2]['date'] = str(self.today + datetime.timedelta(days=1))
+        rows[3]['task'] = 0
+        response = self.client.post('/api/time-entries/timesheet/', rows, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([error['row'] for error in response.data['errors']], [1, 2, 3])
+        self.assertFalse(TimeEntry.objects.exists())
+
+    def test_only_superusers_log_for_others(self):
+        other = Employee.objects.create(user=User.objects.create_user('other'), position='Engineer')
+        self.client.force_authenticate(other.user)
+        rows = self.rows(1)
+        rows[0]['employee'] = self.employee.pk
+        response = self.client.post('/api/time-entries/timesheet/', rows, format='json')
+        self.assertEqual(response.data['errors'][0]['errors']['employee'], ['You can only log your own time'])
+
+
+class TimeEntryExportTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee.hourly_rate = 20
+        self.employee.save()
+        self.task = self.create_task(self.create_project('Payroll'), 'Invoicing')
+
+    def log_time(self, count, days_ago=0):
+        for i in range(count):
+            TimeEntry.objects.create(task=self.task, employee=self.employee, hours_spent='1.5',
+                                     date=self.today - datetime.timedelta(days=days_ago))
+
+    def export(self, query=''):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/time-entries/export/{query}')
+            content = b''.join(response.streaming_content).decode()
+        return response, content, len(queries)
+
+    def test_csv(self):
+        self.log_time(2)
+        response, content, _ = self.export()
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        lines = content.splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['id', 'date', 'employee_id'])
+        self.assertEqual(len(lines), 3)
+        self.assertIn(',20.00,1.50,30.00,', lines[1])
+        self.assertIn('Invoicing,', lines[1])
+
+    def test_ndjson_with_date_range(self):
+        self.log_time(2)
+        self.log_time(1, days_ago=40)
+        since = self.today - datetime.timedelta(days=7)
+        _, content, _ = self.export(f'?file_format=ndjson&date__gte={since}')
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]['cost'], '30.00')
+        self.assertEqual(rows[0]['project'], 'Payroll')
+
+    def test_single_query(self):
+        self.log_time(1)
+        queries = self.export()[2]
+        self.log_time(50)
+        self.assertEqual(self.export()[2], queries)
+
+    def test_invalid_format(self):
+        self.assertEqual(self.client.get('/api/time-entries/export/?file_format=xml').status_code, 400)
+
+
+class BurnDownTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.employee.hourly_rate = 50
+        self.employee.save()
+        start = self.today - datetime.timedelta(days=13)
+        self.project = self.create_project(start_date=start, end_date=self.today, budget=1000)
+        task = self.create_task(self.project)
+        for days, hours in [(0, 2), (0, 1), (2, 4), (13, 1)]:
+            TimeEntry.objects.create(task=task, employee=self.employee, date=start + datetime.timedelta(days=days),
+                                     hours_spent=hours)
+
+    def test_daily(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'/api/projects/{self.project.pk}/burn_down/').data
+        self.assertEqual(len(queries), 2)
+        self.assertEqual(len(data['periods']), 14)
+        self.assertEqual(data['cost'][:3], [150.0, 0.0, 200.0])
+        self.assertEqual(data['cumulative_cost'][-1], 400.0)
+        self.assertEqual(data['remaining_budget'][-1], 600.0)
+        self.assertEqual(data['planned_cost'][-1], 1000.0)
+        self.assertEqual(data['total_cost'], Decimal('400.00'))
+
+    def test_weekly(self):
+        data = self.client.get(f'/api/projects/{self.project.pk}/burn_down/', {'interval': 'week'}).data
+        self.assertEqual(sum(data['cost']), 400.0)
+        self.assertEqual(data['cumulative_cost'], list(itertools.accumulate(data['cost'])))
+        self.assertTrue(all(datetime.date.fromisoformat(period).weekday() == 0 for period in data['periods']))
+
+    def test_costs_logged_before_the_start_date(self):
+        TimeEntry.objects.create(task=self.project.tasks.get(), employee=self.employee,
+                                 date=self.project.start_date - datetime.timedelta(days=3), hours_spent=2)
+        for interval in ('day', 'week'):
+            with self.subTest(interval):
+                data = self.client.get(f'/api/projects/{self.project.pk}/burn_down/', {'interval': interval}).data
+                self.assertEqual(data['total_cost'], Decimal('500.00'))
+                self.assertEqual(data['total_cost'], ProjectStats.objects.get(project=self.project).cost)
+                self.assertEqual(sum(data['cost']), 500.0)
+        data = self.client.get(f'/api/projects/{self.project.pk}/burn_down/').data
+        self.assertEqual(data['periods'][0], (self.project.start_date - datetime.timedelta(days=3)).isoformat())
+        self.assertEqual(data['cost'][:4], [100.0, 0.0, 0.0, 150.0])
+
+    def test_invalid_interval(self):
+        response = self.client.get(f'/api/projects/{self.project.pk}/burn_down/', {'interval': 'year'})
+        self.assertEqual(response.status_code, 400)
+
+
+class CapacityTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.monday = self.today - datetime.timedelta(days=self.today.weekday())
+        TeamMembership.objects.create(team=self.team, employee=self.employee)
+        outsider = Employee.objects.create(user=User.objects.create_user('outsider'), position='Sales')
+        project = self.create_project(start_date=self.monday - datetime.timedelta(weeks=4))
+        self.create_task(project, 'Open', assigned_to=self.employee, estimated_hours=6, due_date=self.monday)
+        self.create_task(project, 'Next week', assigned_to=self.employee, estimated_hours=3,
+                         due_date=self.monday + datetime.timedelta(days=8))
+        self.create_task(project, 'Done', assigned_to=self.employee, estimated_hours=5, due_date=self.monday,
+                         status='completed')
+        task = self.create_task(project, 'Other', assigned_to=outsider, estimated_hours=2, due_date=self.monday)
+        TimeEntry.objects.create(task=task, employee=self.employee, date=self.monday, hours_spent=4)
+        TimeEntry.objects.create(task=task, employee=outsider, date=self.monday, hours_spent=1)
+
+    def test_team_matrix(self):
+        params = {'team': self.team.pk, 'start': self.monday.isoformat(),
+                  'end': (self.monday + datetime.timedelta(days=7)).isoformat()}
+        data = self.client.get('/api/employees/capacity/', params).data
+        self.assertEqual(data['weeks'], [self.monday.isoformat(), (self.monday + datetime.timedelta(days=7)).isoformat()])
+        self.assertEqual([employee['id'] for employee in data['employees']], [self.employee.pk])
+        self.assertEqual(data['planned'], [[6.0, 3.0]])
+        self.assertEqual(data['logged'], [[4.0, 0.0]])
+        self.assertEqual(data['planned_per_week'], [6.0, 3.0])
+
+    def test_team_members_who_left_before_the_range_are_excluded(self):
+        former = Employee.objects.create(user=User.objects.create_user('former'), position='Engineer')
+        leaver = Employee.objects.create(user=User.objects.create_user('leaver'), position='Engineer')
+        TeamMembership.objects.create(team=self.team, employee=former, left_date=self.monday - datetime.timedelta(days=1))
+        TeamMembership.objects.create(team=self.team, employee=leaver, left_date=self.monday + datetime.timedelta(days=2))
+        # A current membership of another team does not count
+        TeamMembership.objects.create(team=Team.objects.create(name='Sales'), employee=former)
+        params = {'team': self.team.pk, 'start': self.monday.isoformat()}
+        data = self.client.get('/api/employees/capacity/', params).data
+        self.assertEqual(sorted(employee['id'] for employee in data['employees']), [self.employee.pk, leaver.pk])
+
+    def test_all_employees(self):
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/api/employees/capacity/', {'start': self.monday.isoformat()}).data
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(len(data['employees']), 2)
+        self.assertEqual(len(data['weeks']), 9)
+        self.assertEqual(sum(data['logged_per_employee']), 5.0)
+
+    def test_invalid_range(self):
+        response = self.client.get('/api/employees/capacity/', {'start': '2024-02-01', 'end': '2024-01-01'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TimelineTests(APITestCase):
+    def test_columns_and_edges(self):
+        project = self.create_project()
+        first = self.create_task(project, 'First', estimated_hours=3, assigned_to=self.employee)
+        second = self.create_task(project, 'Second', parent_task=first)
+        second.dependencies.add(first)
+        # Dependencies on other projects' tasks are not drawn
+        second.dependencies.add(self.create_task(self.create_project('Other'), 'Elsewhere'))
+
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(f'/api/projects/{project.pk}/timeline/').data
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(data['id'], [first.pk, second.pk])
+        self.assertEqual(data['title'], ['First', 'Second'])
+        self.assertEqual(data['due_date'], [self.today.isoformat()] * 2)
+        self.assertEqual(data['start'][0], timezone.localdate(first.created_at).isoformat())
+        self.assertEqual(data['estimated_hours'], [3.0, None])
+        self.assertEqual(data['assigned_to'], [self.employee.pk, None])
+        self.assertEqual(data['parent_task'], [None, first.pk])
+        self.assertEqual(data['edges'], {'task': [second.pk], 'depends_on': [first.pk]})
+
+    def test_empty_project(self):
+        data = self.client.get(f'/api/projects/{self.create_project().pk}/timeline/').data
+        self.assertEqual((data['id'], data['edges']['task']), ([], []))
+
+
+class TaskGraphTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.create_project(start_date=self.today)
+
+    def create_task(self, project, title='Task', **kwargs):
+        kwargs.setdefault('estimated_hours', 8)
+        kwargs.setdefault('due_date', self.today + datetime.timedelta(days=10))
+        return super().create_task(project, title, **kwargs)
+
+    def test_schedule(self):
+        design = self.create_task(self.project, 'Design', estimated_hours=8)
+        build = self.create_task(self.project, 'Build', estimated_hours=16)
+        docs = self.create_task(self.project, 'Docs', estimated_hours=4)
+        release = self.create_task(self.project, 'Release', estimated_hours=2, due_date=self.today + datetime.timedelta(days=1))
+        build.dependencies.add(design)
+        docs.dependencies.add(design)
+        release.dependencies.add(build, docs)
+
+        with CaptureQueriesContext(connection) as queries:
+            schedule = graph.TaskGraph.for_project(self.project.pk).schedule(self.today)
+        self.assertEqual(len(queries), 2)
+        order = schedule['order']
+        self.assertEqual(order[0], design.pk)
+        self.assertEqual(order[-1], release.pk)
+        self.assertEqual(schedule['critical_path'], [design.pk, build.pk, release.pk])
+        self.assertEqual(schedule['duration_hours'], 26)
+        values = {column: dict(zip(order, schedule[column])) for column in ('earliest_start', 'slack')}
+        self.assertEqual(values['earliest_start'][release.pk], 24)
+        # Docs can slip while Build runs; Release is due after 16 hours but needs 26
+        self.assertEqual(values['slack'][docs.pk], 2)
+        self.assertEqual(values['slack'][release.pk], -10)
+
+    def test_cycle_rejected_on_write(self):
+        first = self.create_task(self.project, 'First')
+        second = self.create_task(self.project, 'Second')
+        third = self.create_task(self.project, 'Third')
+        second.dependencies.add(first)
+        third.dependencies.add(second)
+        for add in (lambda: first.dependencies.add(third), lambda: third.task_set.add(first),
+                    lambda: first.dependencies.add(first)):
+            with self.assertRaises(ValidationError), transaction.atomic():
+                add()
+        self.assertFalse(first.dependencies.exists())
+
+    def test_cycle_rejected_by_api(self):
+        first = self.create_task(self.project, 'First')
+        second = self.create_task(self.project, 'Second')
+        second.dependencies.add(first)
+        response = self.client.patch(f'/api/tasks/{first.pk}/', {'dependencies': [second.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cycle', response.data['dependencies'][0])
+
+    def test_cycle_rejected_by_admin(self):
+        first = self.create_task(self.project, 'First')
+        second = self.create_task(self.project, 'Second')
+        second.dependencies.add(first)
+        self.client.force_login(self.user)
+        data = {
+            'project': self.project.pk, 'title': 'First', 'description': 'First', 'due_date': self.today,
+            'status': 'pending', 'priority': 'medium', 'completion_percentage': 0, 'attachments': '[]',
+            'dependencies': [second.pk],
+        }
+        for prefix in ('comments', 'time_entries'):
+            data.update({f'{prefix}-TOTAL_FORMS': 0, f'{prefix}-INITIAL_FORMS': 0})
+        response = self.client.post(reverse('admin:core_task_change', args=[first.pk]), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cycle', str(response.context['adminform'].form.errors['dependencies']))
+        self.assertFalse(first.dependencies.exists())
+
+    def test_schedule_endpoint_reports_cycles(self):
+        first = self.create_task(self.project, 'First')
+        second = self.create_task(self.project, 'Second')
+        second.dependencies.add(first)
+        url = f'/api/projects/{self.project.pk}/schedule/'
+        self.assertEqual(self.client.get(url).data['order'], [first.pk, second.pk])
+        # Written behind the back of the signals, e.g. by a raw import
+        Task.dependencies.through.objects.create(from_task=first, to_task=second)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['cycle'][0], response.data['cycle'][-1])
+
+
+class TaskTreeTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        project = self.create_project()
+        self.root = self.create_task(project, 'Root', estimated_hours=2, completion_percentage=100)
+        self.child = self.create_task(project, 'Child', parent_task=self.root, estimated_hours=4,
+                                      actual_hours=1, completion_percentage=50)
+        self.grandchild = self.create_task(project, 'Grandchild', parent_task=self.child, estimated_hours=2)
+        self.sibling = self.create_task(project, 'Sibling', parent_task=self.root)
+        self.create_task(project, 'Unrelated')
+
+    def test_subtree(self):
+        self.assertEqual(
+            set(Task.objects.subtree(self.child.pk)), {self.child, self.grandchild}
+        )
+        self.assertEqual(set(Task.objects.subtree(self.root.pk, max_depth=1)), {self.root, self.child, self.sibling})
+
+    def test_nested(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/api/tasks/{self.root.pk}/tree/')
+        self.assertEqual(len(queries), 2)
+        root = response.data
+        self.assertEqual([child['title'] for child in root['children']], ['Child', 'Sibling'])
+        child = root['children'][0]
+        self.assertEqual((child['depth'], child['children'][0]['depth']), (1, 2))
+        self.assertEqual(child['rollup'], {
+            'estimated_hours': '6.00', 'actual_hours': '1.00', 'completion_percentage': 33.33, 'tasks': 2,
+        })
+        self.assertEqual(root['rollup']['estimated_hours'], '8.00')
+        self.assertEqual(root['rollup']['completion_percentage'], 50.0)
+
+    def test_flat(self):
+        response = self.client.get(f'/api/tasks/{self.root.pk}/tree/', {'flat': 'true', 'max_depth': 1})
+        self.assertEqual([(node['title'], node['depth']) for node in response.data],
+                         [('Root', 0), ('Child', 1), ('Sibling', 1)])
+        self.assertNotIn('children', response.data[0])
+
+    def test_missing(self):
+        self.assertEqual(self.client.get('/api/tasks/0/tree/').status_code, 404)
+
+
+class ConditionalGetTests(APITestCase):
+    def get_etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_list_not_modified(self):
+        project = self.create_project()
+        self.create_task(project)
+        url = '/api/tasks/'
+        etag = self.get_etag(url)
+        response_cache.get_cache().clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(len(queries), 1)
+
+    def test_list_changes_with_writes_and_deletes(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        other = self.create_task(project, 'Other')
+        url = '/api/tasks/'
+        etag = self.get_etag(url)
+        Task.objects.filter(pk=task.pk).update(status='completed', updated_at=timezone.now())
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.get_etag(url)
+        other.delete()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_list_changes_with_filters(self):
+        self.create_task(self.create_project())
+        etag = self.get_etag('/api/tasks/')
+        response = self.client.get('/api/tasks/', {'status': 'completed'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def assertChangesETag(self, url, change):
+        etag = self.get_etag(url)
+        response_cache.get_cache().clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        change()
+        response_cache.get_cache().clear()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_detail_follows_related_rows(self):
+        project = self.create_project()
+        # Adding a task touches the ProjectStats rollup the counts are read from
+        self.assertChangesETag(f'/api/projects/{project.pk}/?expand=team', lambda: self.create_task(project))
+
+    def test_project_detail_follows_nested_team(self):
+        project = self.create_project()
+        sibling = self.create_project('Sibling', status='in_progress')
+        url = f'/api/projects/{project.pk}/?expand=team'
+
+        def complete_sibling():
+            sibling.status = 'completed'
+            sibling.save()
+        self.assertChangesETag(url, complete_sibling)
+        other = Employee.objects.create(user=User.objects.create_user('other'), position='Engineer')
+        self.assertChangesETag(url, lambda: TeamMembership.objects.create(team=self.team, employee=other))
+
+    def test_task_detail_follows_nested_project_and_subtasks(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        subtask = self.create_task(project, 'Subtask', parent_task=task)
+        first, second = self.create_task(project, 'First'), self.create_task(project, 'Second')
+        subtask.dependencies.add(first)
+        url = f'/api/tasks/{task.pk}/?expand=project,subtasks'
+
+        def rename_project():
+            project.name = 'Renamed'
+            project.save()
+        self.assertChangesETag(url, rename_project)
+
+        def swap_dependency():
+            subtask.dependencies.remove(first)
+            subtask.dependencies.add(second)
+        self.assertChangesETag(url, swap_dependency)
+
+    def test_list_follows_moved_dependencies(self):
+        project = self.create_project()
+        first, second, third = (self.create_task(project, title) for title in ('First', 'Second', 'Third'))
+        first.dependencies.add(third)
+        url = '/api/tasks/'
+
+        def move_dependency():
+            first.dependencies.remove(third)
+            second.dependencies.add(third)
+        self.assertChangesETag(url, move_dependency)
+        # Reverse managers and clear() touch the dependent tasks too
+        self.assertChangesETag(url, lambda: third.task_set.clear())
+        self.assertChangesETag(url, lambda: third.task_set.add(first))
+        self.assertEqual(
+            {row['id']: row['dependencies'] for row in self.client.get(url).data['results']},
+            {first.pk: [third.pk], second.pk: [], third.pk: []},
+        )
+
+    def test_team_list_follows_memberships(self):
+        other = Employee.objects.create(user=User.objects.create_user('other'), position='Engineer')
+        self.assertChangesETag('/api/teams/', lambda: TeamMembership.objects.create(team=self.team, employee=other))
+
+    def test_nested_users_are_not_validated(self):
+        project = self.create_project()
+        task = self.create_task(project, assigned_to=self.employee)
+        urls = [
+            f'/api/employees/{self.employee.pk}/', '/api/employees/', f'/api/teams/{self.team.pk}/',
+            f'/api/tasks/{task.pk}/', f'/api/projects/{project.pk}/',
+        ]
+        for url in urls:
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('ETag', response)
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        data = self.client.get(f'/api/employees/{self.employee.pk}/').data
+        self.assertEqual(data['user']['first_name'], 'Renamed')
+
+    def test_if_modified_since(self):
+        comment = Comment.objects.create(task=self.create_task(self.create_project()), author=self.employee, content='Hi')
+        url = f'/api/comments/{comment.pk}/'
+        last_modified = self.client.get(url)['Last-Modified']
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+    def test_no_last_modified_where_deletions_cannot_move_it(self):
+        project = self.create_project()
+        task = self.create_task(project)
+        Comment.objects.create(task=task, author=self.employee, content='Hi')
+        for url in ['/api/tasks/', '/api/comments/', f'/api/projects/{project.pk}/?expand=team']:
+            with self.subTest(url):
+                response = self.client.get(url)
+                self.assertIn('ETag', response)
+                self.assertNotIn('Last-Modified', response)
+
+    def test_keyset_pages_are_not_validated(self):
+        self.create_task(self.create_project())
+        for url in ['/api/tasks/?cursor=', '/api/comments/?cursor=', '/api/time-entries/?cursor=']:
+            with self.subTest(url):
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertNotIn('ETag', response)
+                self.assertFalse(any('COUNT(' in query['sql'] for query in queries), queries.captured_queries)
+
+    def test_missing_detail(self):
+        self.assertEqual(self.client.get('/api/tasks/0/').status_code, 404)
+        self.assertEqual(self.client.get('/api/tasks/abc/').status_code, 404)
+
+
+class ResponseCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        response_cache.reset_stats()
+        self.project = self.create_project()
+        self.task = self.create_task(self.project)
+
+    def test_hit_skips_database(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'HIT')
+        self.assertEqual(response.data['title'], 'Task')
+        self.assertEqual(len(queries), 0)
+        self.assertEqual(response_cache.cache_stats(), {'hits': 1, 'misses': 1})
+
+    def test_hit_answers_conditional_request(self):
+        url = f'/api/tasks/{self.task.pk}/?expand=project'
+        etag = self.client.get(url)['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response['X-Cache']), (304, 'HIT'))
+
+    def test_save_invalidates(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        self.client.get(url)
+        self.task.title = 'Renamed'
+        self.task.save()
+        response = self.client.get(url)
+        self.assertEqual((response['X-Cache'], response.data['title']), ('MISS', 'Renamed'))
+
+    def test_bulk_update_invalidates_related_views(self):
+        url = f'/api/projects/{self.project.pk}/'
+        self.assertEqual(self.client.get(url).data['completion_percentage'], 0)
+        # The admin's mark_completed action updates in bulk, without signals
+        Task.objects.filter(pk=self.task.pk).update(status='completed')
+        self.assertEqual(self.client.get(url).data['completion_percentage'], 100)
+
+    def test_m2m_change_invalidates(self):
+        other = self.create_task(self.project, 'Other')
+        url = f'/api/tasks/{self.task.pk}/'
+        self.client.get(url)
+        self.task.dependencies.add(other)
+        self.assertEqual(self.client.get(url).data['dependencies'], [other.pk])
+
+    def test_keyed_by_user(self):
+        other = User.objects.create_user('other')
+        url = f'/api/tasks/{self.task.pk}/'
+        self.client.get(url)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'HIT')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+    def test_demoted_user_does_not_see_cached_entries(self):
+        other = Employee.objects.create(user=User.objects.create_user('other'), position='Engineer')
+        TimeEntry.objects.create(task=self.task, employee=self.employee, date=self.today, hours_spent=1)
+        TimeEntry.objects.create(task=self.task, employee=other, date=self.today, hours_spent=2)
+        self.assertEqual(len(self.client.get('/api/time-entries/').data['results']), 2)
+        self.user.is_superuser = False
+        self.user.save()
+        response = self.client.get('/api/time-entries/')
+        self.assertEqual((response['X-Cache'], len(response.data['results'])), ('MISS', 1))
+
+    def test_user_flags_are_part_of_the_key(self):
+        url = f'/api/tasks/{self.task.pk}/'
+        self.client.get(url)
+        # Flags changed without signals, e.g. through QuerySet.update()
+        self.user.is_superuser = False
+        self.assertEqual(self.client.get(url)['X-Cache'], 'MISS')
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        project = self.create_project()
+        for i in range(25):
+            # Few distinct due dates and priorities so the id tiebreaker matters
+            self.create_task(project, f'Task {i}', due_date=self.today - datetime.timedelta(days=i % 3),
+                             priority=['low', 'medium', 'high'][i % 2], status=['pending', 'completed'][i % 3 == 0])
+
+    def walk(self, url):
+        ids, pages = [], []
+        while url:
+            data = self.client.get(url).data
+            self.assertNotIn('count', data)
+            ids.extend(row['id'] for row in data['results'])
+            pages.append(data)
+            url = data['next']
+        return ids, pages
+
+    def test_pages_follow_default_ordering(self):
+        ids, pages = self.walk('/api/tasks/?cursor=')
+        expected = list(Task.objects.order_by('due_date', 'priority', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_pages_follow_ordering_filter(self):
+        ids, _ = self.walk('/api/tasks/?cursor=&ordering=-status')
+        expected = list(Task.objects.order_by('-status', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_previous_link(self):
+        first = self.client.get('/api/tasks/?cursor=').data
+        second = self.client.get(first['next']).data
+        back = self.client.get(second['previous']).data
+        self.assertEqual(back['results'], first['results'])
+
+    def test_descending_ordering_with_filters(self):
+        task = Task.objects.first()
+        for i in range(15):
+            TimeEntry.objects.create(task=task, employee=self.employee, hours_spent=1,
+                                     date=self.today - datetime.timedelta(days=i % 4))
+        ids, _ = self.walk(f'/api/time-entries/?cursor=&task={task.pk}')
+        expected = list(TimeEntry.objects.order_by('-date', 'id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+
+    def test_deep_page_skips_count(self):
+        url = self.client.get('/api/tasks/?cursor=').data['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        self.assertFalse(any('COUNT(*)' in query['sql'] for query in queries))
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get('/api/tasks/?cursor=bogus').status_code, 404)
+
+    def test_page_number_pagination_is_default(self):
+        self.assertEqual(self.client.get('/api/tasks/').data['count'], 25)
+
+
+class FullTextSearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.project = self.create_project()
+        self.login = self.create_task(self.project, 'Login page', description='Build the authentication form')
+        self.report = self.create_task(self.project, 'Monthly report', description='Export the login audit')
+        self.create_task(self.project, 'Unrelated', description='Nothing to see')
+
+    def search(self, url):
+        return [row['id'] for row in self.client.get(url).data['results']]
+
+    def test_ranked_prefix_search(self):
+        ids = self.search('/api/tasks/?search=log&search_mode=fulltext')
+        self.assertEqual(ids, [self.login.pk, self.report.pk])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite FTS5')
+    def test_rank_reads_the_joined_index(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.search('/api/tasks/?search=log&search_mode=fulltext&fields=id')
+        page = [query['sql'] for query in queries if 'bm25' in query['sql']]
+        self.assertEqual(len(page), 1)
+        self.assertEqual(page[0].count('MATCH'), 1)
+
+    def test_all_words_must_match(self):
+        ids = self.search('/api/tasks/?search=audit%20export&search_mode=fulltext')
+        self.assertEqual(ids, [self.report.pk])
+
+    def test_index_follows_writes(self):
+        self.login.title = 'Signup page'
+        self.login.save()
+        Task.objects.filter(pk=self.report.pk).update(description='Signup numbers')
+        self.assertEqual(self.search('/api/tasks/?search=login&search_mode=fulltext'), [])
+        self.assertEqual(len(self.search('/api/tasks/?search=signup&search_mode=fulltext')), 2)
+        self.report.delete()
+        self.assertEqual(self.search('/api/tasks/?search=signup&search_mode=fulltext'), [self.login.pk])
+
+    def test_comment_search(self):
+        comment = Comment.objects.create(task=self.login, author=self.employee, content='Needs a captcha')
+        self.assertEqual(self.search('/api/comments/?search=capt&search_mode=fulltext'), [comment.pk])
+
+    def test_like_fallback_backend(self):
+        backend = search.LikeSearchBackend()
+        matches = Task.objects.filter(backend.matches(Task, 'export audit'))
+        self.assertEqual(list(matches), [self.report])
+
+    def test_default_search_is_unchanged(self):
+        self.assertEqual(self.search('/api/tasks/?search=uthenticat'), [self.login.pk])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite triggers')
+    def test_migrate_restores_dropped_triggers(self):
+        # What Django leaves behind when a schema change rebuilds the table
+        with connection.cursor() as cursor:
+            for suffix in ('_ai', '_ad', '_au'):
+                cursor.execute(f'DROP TRIGGER "core_task_fts{suffix}"')
+        signup = self.create_task(self.project, 'Signup page', description='Written without triggers')
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        self.assertEqual(self.search('/api/tasks/?search=signup&search_mode=fulltext'), [signup.pk])
+        signup.delete()
+        self.assertEqual(self.search('/api/tasks/?search=signup&search_mode=fulltext'), [])
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite triggers')
+    def test_backend_installs_what_the_migrations_did(self):
+        def schema():
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT name, sql FROM sqlite_master WHERE name LIKE '%%\\_fts%%' ESCAPE '\\'")
+                return dict(cursor.fetchall())
+        migrated = schema()
+        self.assertEqual(len([name for name in migrated if name.endswith(('_ai', '_ad', '_au'))]), 9)
+        search.uninstall_indexes(connection)
+        search.install_indexes(connection)
+        self.assertEqual(schema(), migrated)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'SQLite triggers')
+    def test_migrate_leaves_uninstalled_indexes_alone(self):
+        search.uninstall_indexes(connection, ['core.Comment'])
+        emit_post_migrate_signal(verbosity=0, interactive=False, db='default')
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE name LIKE 'core_comment_fts%%'")
+            self.assertEqual(cursor.fetchall(), [])
+        search.install_indexes(connection, ['core.Comment'])
+
+
+class PerformanceBudgetTests(TestCase):
+    """Query count and latency budgets for every API endpoint and admin changelist"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.dataset = benchmarks.seed_dataset(scale=int(os.environ.get('PERF_SCALE', 1)))
+
+    def test_budgets(self):
+        api_client = APIClient()
+        api_client.force_authenticate(self.user)
+        self.client.force_login(self.user)
+        results = benchmarks.run_suite(api_client, self.client)
+        plans = benchmarks.explain_access_paths()
+        throughput = benchmarks.list_throughput()
+        rendering = benchmarks.renderer_throughput(benchmarks.renderer_payloads())
+        authentication = benchmarks.auth_throughput(self.user)
+        if os.environ.get('PERF_REPORT'):
+            benchmarks.write_report(
+                os.environ['PERF_REPORT'], self.dataset, results, plans, throughput + rendering + authentication
+            )
+        self.assertEqual(benchmarks.budget_violations(results), [])
+        for plan in plans:
+            with self.subTest(plan['name']):
+                self.assertTrue(plan['uses_index'], plan['plan'])
+        for result in throughput:
+            with self.subTest(result['name']):
+                self.assertTrue(result['identical'])
+        for result in rendering:
+            with self.subTest(result['payload'], renderer=result['renderer']):
+                self.assertIn(result['matches_json'], (True, None))
+        uncached, cached = authentication
+        self.assertEqual((uncached['status'], cached['status']), (200, 200))
+        self.assertLess(cached['queries_per_request'], uncached['queries_per_request'])
+
+    def test_admin_changelists_do_not_query_per_row(self):
+        self.client.force_login(self.user)
+        urls = [reverse(f'admin:{name}_changelist') for name in ('core_task', 'core_comment', 'core_timeentry')]
+        for url in urls:
+            self.client.get(url)
+        before = [benchmarks.measure(self.client, url)['queries'] for url in urls]
+
+        task = Task.objects.first()
+        for index in range(5):
+            user = User.objects.create_user(f'extra{index}', first_name='Extra', last_name=str(index))
+            employee = Employee.objects.create(user=user, position='Engineer')
+            copy = Task.objects.create(
+                project=task.project, title=f'Extra {index}', description='Extra', assigned_to=employee,
+                due_date=task.due_date,
+            )
+            Comment.objects.create(task=copy, author=employee, content='Extra')
+            TimeEntry.objects.create(task=copy, employee=employee, date=datetime.date(2024, 1, 1), hours_spent=1)
+        self.assertEqual([benchmarks.measure(self.client, url)['queries'] for url in urls], before)
 
-# Create your tests here.
+        task = Task.objects.with_time_logged().filter(time_logged__gt=0).first()
+        response = self.client.get(reverse('admin:core_task_changelist'), {'q': task.title})
+        self.assertContains(response, f'{task.time_logged:.1f}hrs')
+        self.assertContains(self.client.get(reverse('admin:core_comment_changelist')), 'Extra 0')
@@ -0,0 +1,47 @@
+"""
+Column-oriented task timeline of a project for Gantt charts.
+
+Only the columns the chart draws are read, with ``values_list()``, and
+returned as parallel arrays indexed like ``id``, together with the
+dependency edges as two more arrays. Tasks have no start date of their
+own, so ``start`` is the day the task was created in the current time
+zone, truncated by the database. Edges between tasks of different
+projects are left out, as in ``TaskGraph.for_project``.
+"""
+from django.db.models.functions import TruncDate
+
+from .models import Task
+
+COLUMNS = (
+    'id', 'title', 'start', 'due_date', 'status', 'priority', 'completion_percentage',
+    'estimated_hours', 'assigned_to', 'parent_task',
+)
+
+
+def _isoformat(values):
+    return [value.isoformat() if value is not None else None for value in values]
+
+
+def _float(values):
+    return [float(value) if value is not None else None for value in values]
+
+
+def project_timeline(project_id):
+    """Return the project's tasks as ``{column: [values]}`` plus ``edges`` with two queries"""
+    rows = Task.objects.filter(project_id=project_id).order_by('pk').annotate(
+        start=TruncDate('created_at'),
+    ).values_list(
+        'pk', 'title', 'start', 'due_date', 'status', 'priority', 'completion_percentage',
+        'estimated_hours', 'assigned_to_id', 'parent_task_id',
+    )
+    columns = dict(zip(COLUMNS, map(list, zip(*rows)))) or {column: [] for column in COLUMNS}
+    columns['start'] = _isoformat(columns['start'])
+    columns['due_date'] = _isoformat(columns['due_date'])
+    columns['estimated_hours'] = _float(columns['estimated_hours'])
+
+    edges = Task.dependencies.through.objects.filter(
+        from_task__project_id=project_id, to_task__project_id=project_id
+    ).order_by('from_task_id', 'to_task_id').values_list('from_task_id', 'to_task_id')
+    task_ids, dependency_ids = map(list, zip(*edges)) if edges else ([], [])
+    columns['edges'] = {'task': task_ids, 'depends_on': dependency_ids}
+    return columns
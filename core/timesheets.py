@@ -0,0 +1,108 @@
+"""
+Bulk ingestion of timesheet rows into ``TimeEntry``.
+
+Rows are consumed lazily in batches. Each batch is validated column by
+column, resolves its tasks and employees with one query each and is
+written with ``bulk_create``. The whole submission runs in a single
+transaction that is rolled back if any row is invalid.
+"""
+import csv
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+
+from .models import Employee, Task, TimeEntry
+
+BATCH_SIZE = 500
+MAX_ERRORS = 100
+
+_hours_field = serializers.DecimalField(max_digits=5, decimal_places=2)
+_date_field = serializers.DateField()
+_pk_field = serializers.IntegerField()
+
+
+def _column(rows, name, field, errors, required=True):
+    """Convert one column of a batch, recording errors per row index"""
+    values = []
+    for index, row in enumerate(rows):
+        raw = row.get(name)
+        if raw in (None, ''):
+            if required:
+                errors.setdefault(index, {})[name] = ['This field is required.']
+            values.append(None)
+            continue
+        try:
+            values.append(field.to_internal_value(raw))
+        except serializers.ValidationError as exc:
+            errors.setdefault(index, {})[name] = exc.detail
+            values.append(None)
+    return values
+
+
+def _validate_batch(rows, default_employee, allow_other_employees):
+    errors = {}
+    rows = [row if isinstance(row, dict) else {} for row in rows]
+    hours = _column(rows, 'hours_spent', _hours_field, errors)
+    dates = _column(rows, 'date', _date_field, errors)
+    task_ids = _column(rows, 'task', _pk_field, errors)
+    employee_ids = _column(rows, 'employee', _pk_field, errors, required=False)
+
+    # The same rules as TimeEntry.clean(), applied to whole columns
+    today = timezone.now().date()
+    for index, value in enumerate(hours):
+        if value is not None and value <= 0:
+            errors.setdefault(index, {})['hours_spent'] = ['Hours spent must be greater than 0']
+    for index, value in enumerate(dates):
+        if value is not None and value > today:
+            errors.setdefault(index, {})['date'] = ['Cannot log time for future dates']
+
+    employee_ids = [pk or getattr(default_employee, 'pk', None) for pk in employee_ids]
+    tasks = Task.objects.in_bulk(set(task_ids) - {None})
+    employees = Employee.objects.in_bulk(set(employee_ids) - {None})
+    entries = []
+    for index, row in enumerate(rows):
+        if task_ids[index] is not None and task_ids[index] not in tasks:
+            errors.setdefault(index, {})['task'] = [f'Invalid pk "{task_ids[index]}" - object does not exist.']
+        employee = employees.get(employee_ids[index])
+        if employee is None:
+            errors.setdefault(index, {})['employee'] = ['Unknown employee']
+        elif not allow_other_employees and employee != default_employee:
+            errors.setdefault(index, {})['employee'] = ['You can only log your own time']
+        if index not in errors:
+            entries.append(TimeEntry(
+                task=tasks[task_ids[index]], employee=employee, date=dates[index],
+                hours_spent=hours[index], description=row.get('description') or '',
+            ))
+    return entries, errors
+
+
+def ingest_timesheet(rows, default_employee, allow_other_employees=False, batch_size=BATCH_SIZE):
+    """
+    Validate and insert ``rows`` (dicts with ``task``, ``date``,
+    ``hours_spent`` and optionally ``employee`` and ``description``).
+    Returns ``(created, errors)`` where ``errors`` lists ``{'row': n, ...}``;
+    nothing is kept when there are errors.
+    """
+    rows = iter(rows)
+    created, errors, offset = 0, [], 0
+    with transaction.atomic():
+        try:
+            while batch := list(islice(rows, batch_size)):
+                entries, batch_errors = _validate_batch(batch, default_employee, allow_other_employees)
+                errors.extend({'row': offset + index, 'errors': detail}
+                              for index, detail in sorted(batch_errors.items()))
+                if not errors:
+                    TimeEntry.objects.bulk_create(entries)
+                    created += len(entries)
+                offset += len(batch)
+                if len(errors) >= MAX_ERRORS:
+                    break
+        except csv.Error as exc:
+            raise ParseError(f'CSV parse error on row {offset} - {exc}')
+        if errors:
+            transaction.set_rollback(True)
+            return 0, errors[:MAX_ERRORS]
+    return created, []
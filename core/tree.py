@@ -0,0 +1,66 @@
+"""
+Subtask trees.
+
+``TaskQuerySet.subtree()`` selects a task and all of its descendants with
+one recursive query. ``build_tree`` links the serialized rows to their
+parents and rolls hours and completion up from the leaves, without any
+further queries.
+"""
+from decimal import Decimal
+
+from rest_framework import serializers
+
+_hours_field = serializers.DecimalField(max_digits=12, decimal_places=2)
+
+
+def _hours(value):
+    return Decimal(value) if value is not None else Decimal(0)
+
+
+def build_tree(root_id, rows):
+    """
+    Arrange serialized task ``rows`` under ``root_id``. Every node gains a
+    ``depth``, a ``children`` list and a ``rollup`` of the estimated and
+    actual hours of its subtree plus its completion, weighted by estimated
+    hours (or a plain average when nothing in the subtree is estimated).
+    Returns the root node and all nodes in depth-first order.
+    """
+    nodes = {row['id']: {**row, 'children': []} for row in rows}
+    root = nodes[root_id]
+    for node in nodes.values():
+        parent = nodes.get(node['parent_task'])
+        if parent is not None and node is not root:
+            parent['children'].append(node)
+
+    # Depth-first order, so that reversing it visits children before parents
+    order, stack = [], [(root, 0)]
+    while stack:
+        node, depth = stack.pop()
+        node['depth'] = depth
+        order.append(node)
+        stack.extend((child, depth + 1) for child in reversed(node['children']))
+
+    totals = {}
+    for node in reversed(order):
+        estimated = _hours(node['estimated_hours'])
+        actual = _hours(node['actual_hours'])
+        weighted = estimated * node['completion_percentage']
+        completion, count = node['completion_percentage'], 1
+        for child in node['children']:
+            child_total = totals[child['id']]
+            estimated += child_total['estimated']
+            actual += child_total['actual']
+            weighted += child_total['weighted']
+            completion += child_total['completion']
+            count += child_total['count']
+        totals[node['id']] = {
+            'estimated': estimated, 'actual': actual, 'weighted': weighted,
+            'completion': completion, 'count': count,
+        }
+        node['rollup'] = {
+            'estimated_hours': _hours_field.to_representation(estimated),
+            'actual_hours': _hours_field.to_representation(actual),
+            'completion_percentage': round(float(weighted / estimated if estimated else completion / count), 2),
+            'tasks': count,
+        }
+    return root, order
@@ -1,19 +1,41 @@
 from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action, permission_classes
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Q
-from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.http import Http404
+from django.utils import timezone
+from collections.abc import Iterator
+from datetime import timedelta
 
 # Fix imports to use relative imports from the core app
-from .models import Employee, Task, Team, TeamMembership, Project, Comment, TimeEntry
+from . import exports
+from .authentication import user_cache
+from .budget import INTERVALS, burn_down
+from .capacity import capacity
+from .conditional import ConditionalGetMixin
+from .fast_list import FastListMixin
+from .fieldsets import SparseFieldsetMixin
+from .graph import CycleError, TaskGraph
+from .response_cache import CachedResponseMixin
+from .models import Employee, Task, Team, TeamMembership, Project, ProjectStats, Comment, TimeEntry
+from .pagination import KeysetPagination
+from .parsers import CSVParser, NDJSONParser
+from .search import FullTextSearchFilter
+from .timeline import project_timeline
+from .timesheets import ingest_timesheet
+from .tree import build_tree
 from .serializers import (
     EmployeeSerializer, TaskSerializer, TeamSerializer,
     TeamDetailSerializer, ProjectSerializer, ProjectDetailSerializer,
-    TaskDetailSerializer, CommentSerializer, TimeEntrySerializer
+    TaskDetailSerializer, TaskBulkItemSerializer, CommentSerializer, TimeEntrySerializer,
+    CapacityQuerySerializer
 )
 
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenObtainPairView
 from rest_framework.response import Response
 from rest_framework import status
@@ -25,12 +47,18 @@ from .serializers import UserSerializer
 @permission_classes([AllowAny])
 class CustomTokenObtainPairView(TokenObtainPairView):
     def post(self, request, *args, **kwargs):
-        response = super().post(request, *args, **kwargs)
-        if response.status_code == 200:
-            user = get_user_model().objects.get(username=request.data['username'])
-            user_data = UserSerializer(user).data
-            response.data['user'] = user_data
-        return response
+        serializer = self.get_serializer(data=request.data)
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
+        # The serializer has already authenticated the user, so neither the
+        # response nor the first authenticated request needs to load it again
+        user_cache.set(serializer.user.pk, serializer.user)
+        return Response(
+            {**serializer.validated_data, 'user': UserSerializer(serializer.user).data},
+            status=status.HTTP_200_OK
+        )
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -38,7 +66,7 @@ def logout(request):
     response = Response({"message": "Successfully logged out"})
     return response
 
-class EmployeeViewSet(viewsets.ModelViewSet):
+class EmployeeViewSet(CachedResponseMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Employee.objects.all()
     serializer_class = EmployeeSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -46,27 +74,69 @@ class EmployeeViewSet(viewsets.ModelViewSet):
     filterset_fields = ['position', 'department', 'is_active']
     search_fields = ['user__username', 'user__first_name', 'user__last_name', 'position']
     ordering_fields = ['user__username', 'position', 'department']
+    conditional_related_fields = ['teammembership__updated_at']
+    cache_models = [get_user_model(), TeamMembership]
+
+    def get_queryset(self):
+        queryset = Employee.objects.all()
+        if self.field_expanded('user'):
+            queryset = queryset.select_related('user')
+        if self.field_requested('teams'):
+            queryset = queryset.prefetch_related('teams')
+        return queryset
+
+    @action(detail=False)
+    def capacity(self, request):
+        """Planned versus logged hours per employee and week, filtered by ``team``, ``start`` and ``end``"""
+        params = CapacityQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        return Response(capacity(**params.validated_data))
 
     @action(detail=True)
     def tasks(self, request, pk=None):
         employee = self.get_object()
-        tasks = Task.objects.filter(assigned_to=employee)
+        tasks = Task.objects.filter(assigned_to=employee).prefetch_related(
+            Prefetch('dependencies', queryset=Task.objects.only('id'))
+        )
         serializer = TaskSerializer(tasks, many=True)
         return Response(serializer.data)
 
-class TeamViewSet(viewsets.ModelViewSet):
+class TeamViewSet(CachedResponseMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Team.objects.all()
     serializer_class = TeamSerializer
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.SearchFilter]
     filterset_fields = ['is_active']
     search_fields = ['name', 'description']
+    conditional_related_fields = ['teammembership__updated_at', 'projects__updated_at']
+    cache_models = [TeamMembership, Employee, get_user_model(), Project]
+
+    def get_queryset(self):
+        queryset = Team.objects.with_counts().order_by(*Team._meta.ordering)
+        nested = self.get_serializer_class() is TeamDetailSerializer
+        if nested and self.field_expanded('team_lead'):
+            queryset = queryset.select_related('team_lead__user').prefetch_related('team_lead__teams')
+        if nested and self.field_expanded('members'):
+            # Nested EmployeeSerializer reads each member's user and teams
+            members = Employee.objects.select_related('user').prefetch_related('teams')
+            return queryset.prefetch_related(Prefetch('members', queryset=members))
+        if self.field_requested('members'):
+            return queryset.prefetch_related(Prefetch('members', queryset=Employee.objects.only('id')))
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['retrieve', 'create', 'update']:
             return TeamDetailSerializer
         return TeamSerializer
 
+    def get_conditional_related_fields(self):
+        if self.get_serializer_class() is TeamDetailSerializer:
+            return self.conditional_related_fields + [
+                'members__updated_at', 'members__teammembership__updated_at',
+                'team_lead__updated_at', 'team_lead__teammembership__updated_at',
+            ]
+        return self.conditional_related_fields
+
     @action(detail=True, methods=['post'])
     def add_member(self, request, pk=None):
         team = self.get_object()
@@ -87,7 +157,7 @@ class TeamViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ProjectViewSet(CachedResponseMixin, ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Project.objects.all()
     serializer_class = ProjectSerializer
     permission_classes = [permissions.IsAuthenticated]
@@ -95,21 +165,37 @@ class ProjectViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'priority', 'team', 'is_archived']
     search_fields = ['name', 'description']
     ordering_fields = ['start_date', 'end_date', 'status']
+    conditional_related_fields = ['stats__updated_at']
+    cache_models = [ProjectStats, Task, Team, TeamMembership, Employee, get_user_model()]
+
+    def get_queryset(self):
+        # Task counts are read from the ProjectStats rollup instead of counted per row
+        return Project.objects.with_task_counts()
+
+    def get_validators(self, queryset):
+        # Overdue counts change at midnight without any row being written
+        return {**super().get_validators(queryset), 'today': timezone.now().date()}
 
     def get_serializer_class(self):
         if self.action in ['retrieve', 'create', 'update']:
             return ProjectDetailSerializer
         return ProjectSerializer
 
+    def get_conditional_related_fields(self):
+        if self.get_serializer_class() is ProjectDetailSerializer:
+            # The nested team renders its members and counts its active projects
+            return self.conditional_related_fields + [
+                'team__updated_at', 'team__teammembership__updated_at', 'team__projects__updated_at',
+                'project_manager__updated_at', 'project_manager__teammembership__updated_at',
+            ]
+        return self.conditional_related_fields
+
     @action(detail=True)
     def tasks_summary(self, request, pk=None):
         project = self.get_object()
-        total_tasks = project.tasks.count()
-        completed_tasks = project.tasks.filter(status='completed').count()
-        overdue_tasks = project.tasks.filter(
-            due_date__lt=datetime.now().date(),
-            status__in=['pending', 'in_progress']
-        ).count()
+        total_tasks = project.total_tasks
+        completed_tasks = project.completed_tasks
+        overdue_tasks = project.overdue_tasks
 
         return Response({
             'total_tasks': total_tasks,
@@ -118,20 +204,157 @@ class ProjectViewSet(viewsets.ModelViewSet):
             'completion_percentage': (completed_tasks / total_tasks * 100) if total_tasks > 0 else 0
         })
 
-class TaskViewSet(viewsets.ModelViewSet):
+    @action(detail=True)
+    def burn_down(self, request, pk=None):
+        """Cumulative cost against the budget per ``?interval=day`` (default) or ``week``"""
+        interval = request.query_params.get('interval', 'day')
+        if interval not in INTERVALS:
+            return Response({'error': 'Invalid interval'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(burn_down(self.get_object(), interval))
+
+    @action(detail=True)
+    def timeline(self, request, pk=None):
+        """Every task of the project as parallel column arrays plus the dependency edges"""
+        return Response(project_timeline(self.get_object().pk))
+
+    @action(detail=True)
+    def schedule(self, request, pk=None):
+        """Topological order, earliest/latest start and critical path of the project's tasks"""
+        project = self.get_object()
+        try:
+            schedule = TaskGraph.for_project(project.pk).schedule(project.start_date)
+        except CycleError as e:
+            return Response({'detail': str(e), 'cycle': e.cycle}, status=status.HTTP_409_CONFLICT)
+        return Response(schedule)
+
+class TaskViewSet(CachedResponseMixin, ConditionalGetMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'priority', 'project', 'assigned_to']
     search_fields = ['title', 'description']
     ordering_fields = ['due_date', 'priority', 'status']
+    conditional_related_fields = ['dependencies__updated_at']
+    cache_models = [Task.dependencies.through, Project, ProjectStats, Employee, TeamMembership, get_user_model(), TimeEntry]
+
+    def get_queryset(self):
+        # Only the ids of dependencies are rendered, so avoid loading full rows.
+        # The id tiebreaker keeps their order stable, as FastListMixin's is.
+        dependencies = Prefetch(
+            'dependencies', queryset=Task.objects.only('id').order_by(*Task._meta.ordering, 'pk')
+        )
+        queryset = Task.objects.all()
+        if self.field_requested('dependencies'):
+            queryset = queryset.prefetch_related(dependencies)
+        if self.get_serializer_class() is not TaskDetailSerializer:
+            return queryset
+        # Everything the nested serializers read is loaded up front: the
+        # project with its task counts, the assignee with user and teams,
+        # subtasks with their dependencies and the hours logged.
+        if self.field_requested('time_logged'):
+            queryset = queryset.with_time_logged()
+        if self.field_expanded('project'):
+            queryset = queryset.prefetch_related(Prefetch('project', queryset=Project.objects.with_task_counts()))
+        if self.field_expanded('assigned_to'):
+            queryset = queryset.prefetch_related(
+                Prefetch('assigned_to', queryset=Employee.objects.select_related('user').prefetch_related('teams'))
+            )
+        if self.field_expanded('subtasks'):
+            queryset = queryset.prefetch_related(Prefetch('subtasks', queryset=Task.objects.prefetch_related(dependencies)))
+        elif self.field_requested('subtasks'):
+            queryset = queryset.prefetch_related(Prefetch('subtasks', queryset=Task.objects.only('id', 'parent_task')))
+        return queryset
 
     def get_serializer_class(self):
         if self.action in ['retrieve', 'create', 'update']:
             return TaskDetailSerializer
         return TaskSerializer
 
+    def get_conditional_related_fields(self):
+        if self.get_serializer_class() is TaskDetailSerializer:
+            return self.conditional_related_fields + [
+                'project__updated_at', 'project__stats__updated_at',
+                'assigned_to__updated_at', 'assigned_to__teammembership__updated_at',
+                'subtasks__updated_at', 'subtasks__dependencies__updated_at', 'time_entries__updated_at',
+            ]
+        return self.conditional_related_fields
+
+    bulk_max_items = 5000
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Create or partially update a list of tasks in one transaction. Items
+        with an ``id`` update that task, the others are created. Nothing is
+        written unless every item is valid; ``errors`` lines up with the input.
+        """
+        items = request.data
+        if not isinstance(items, list) or not items:
+            return Response({'error': 'Expected a list of tasks'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.bulk_max_items:
+            return Response(
+                {'error': f'At most {self.bulk_max_items} tasks per request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        context = {**self.get_serializer_context(), **TaskBulkItemSerializer.preload(items)}
+        errors, tasks, created, updated, update_fields = [], [], [], {}, {'updated_at'}
+        for item in items:
+            instance = None
+            if isinstance(item, dict) and 'id' in item:
+                instance = TaskBulkItemSerializer.get_instance(item, context)
+                if instance is None or instance.pk in updated:
+                    errors.append({'id': ['Unknown or duplicate task id']})
+                    continue
+            serializer = TaskBulkItemSerializer(
+                instance, data=item, partial=instance is not None, context=context
+            )
+            if not serializer.is_valid():
+                errors.append(serializer.errors)
+                continue
+            errors.append({})
+            task = instance or Task()
+            for field, value in serializer.validated_data.items():
+                setattr(task, field, value)
+            if instance is None:
+                created.append(task)
+            else:
+                task.updated_at = timezone.now()
+                updated[task.pk] = task
+                update_fields.update(serializer.validated_data)
+            tasks.append(task)
+
+        if any(errors):
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        with transaction.atomic():
+            Task.objects.bulk_create(created)
+            if updated:
+                Task.objects.bulk_update(updated.values(), update_fields, batch_size=500)
+        return Response({'results': TaskBulkItemSerializer(tasks, many=True, context=context).data})
+
+    @action(detail=True)
+    def tree(self, request, pk=None):
+        """
+        The task with its whole subtask tree and rolled up hours and
+        completion, nested by default or as a depth-first list with
+        ``?flat=true``. ``?max_depth=n`` stops n levels below the task.
+        """
+        try:
+            task_id = int(pk)
+            max_depth = request.query_params.get('max_depth')
+            max_depth = int(max_depth) if max_depth else None
+        except ValueError:
+            return Response({'error': 'Invalid task id or max_depth'}, status=status.HTTP_400_BAD_REQUEST)
+        rows = TaskSerializer(self.get_queryset().subtree(task_id, max_depth), many=True).data
+        if not rows:
+            raise Http404
+        root, order = build_tree(task_id, rows)
+        if request.query_params.get('flat') in ('true', '1'):
+            return Response([{key: value for key, value in node.items() if key != 'children'} for node in order])
+        return Response(root)
+
     @action(detail=True, methods=['post'])
     def update_status(self, request, pk=None):
         task = self.get_object()
@@ -150,23 +373,63 @@ class TaskViewSet(viewsets.ModelViewSet):
 
         return Response({'status': 'task status updated'})
 
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(CachedResponseMixin, ConditionalGetMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter]
     filterset_fields = ['task', 'author']
     search_fields = ['content']
 
-class TimeEntryViewSet(viewsets.ModelViewSet):
+class TimeEntryViewSet(CachedResponseMixin, ConditionalGetMixin, SparseFieldsetMixin, FastListMixin, viewsets.ModelViewSet):
     queryset = TimeEntry.objects.all()
     serializer_class = TimeEntrySerializer
+    pagination_class = KeysetPagination
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
-    filterset_fields = ['task', 'employee', 'date']
+    filterset_fields = {
+        'task': ['exact'],
+        'employee': ['exact'],
+        'date': ['exact', 'gte', 'lte'],
+    }
     ordering_fields = ['date', 'hours_spent']
+    # get_queryset() filters by the requesting user's employee and superuser flag
+    cache_models = [get_user_model(), Employee]
 
     def get_queryset(self):
         if self.request.user.is_superuser:
             return TimeEntry.objects.all()
-        return TimeEntry.objects.filter(employee__user=self.request.user)
\ No newline at end of file
+        return TimeEntry.objects.filter(employee__user=self.request.user)
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, CSVParser, NDJSONParser])
+    def timesheet(self, request):
+        """
+        Ingest a timesheet as a JSON list, NDJSON or CSV with ``task``,
+        ``date``, ``hours_spent`` and optional ``employee`` and ``description``
+        columns. Rows without an employee are logged for the requesting user;
+        only superusers may log time for others.
+        """
+        employee = Employee.objects.filter(user=request.user).first()
+        rows = request.data
+        # JSON bodies must be lists; the CSV and NDJSON parsers return row iterators
+        if not isinstance(rows, (list, Iterator)):
+            return Response({'error': 'Expected a list of time entries'}, status=status.HTTP_400_BAD_REQUEST)
+        created, errors = ingest_timesheet(rows, employee, allow_other_employees=request.user.is_superuser)
+        if errors:
+            return Response({'errors': errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'created': created}, status=status.HTTP_201_CREATED)
+
+    @action(detail=False)
+    def export(self, request):
+        """
+        Stream every matching time entry as CSV (default) or NDJSON with
+        ``file_format=ndjson``, e.g. ``?date__gte=2025-01-01&date__lte=2025-01-31``.
+        """
+        file_format = request.query_params.get('file_format', 'csv')
+        if file_format not in exports.CONTENT_TYPES:
+            return Response({'error': 'file_format must be csv or ndjson'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = self.filter_queryset(self.get_queryset())
+        return exports.streaming_export(
+            exports.TIME_ENTRY_COLUMNS, exports.time_entry_rows(queryset), file_format, 'time-entries'
+        )
\ No newline at end of file
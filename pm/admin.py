@@ -1,11 +1,19 @@
 from django.contrib import admin
 from import_export.admin import ImportExportModelAdmin
 # Register your models here.
-from django.contrib import admin
+from django.contrib import admin , messages
 from django.utils.html import format_html
 from django import forms
+from django.core.exceptions import PermissionDenied
+from django.db.models import Q
+from django.urls import path
+from django.utils import timezone
+from django.utils.text import smart_split , unescape_string_literal
+from core.exports import streaming_export
+from core.search import get_search_backend
 from .models import TestCase , TestCategory , TestPriority , TestEnvironment , TestStep
 from .resources import TestCaseResource
+from . import dependencies
 
 class TestStepInline(admin.TabularInline):
     model = TestStep
@@ -98,6 +106,8 @@ class TestCaseAdmin(ImportExportModelAdmin):
 
     autocomplete_fields = ['project' , 'dependent_on']
 
+    actions = ['propagate_blocked_status']
+
     fieldsets = (
         ('Basic Information' , {
             'fields': (
@@ -140,23 +150,21 @@ class TestCaseAdmin(ImportExportModelAdmin):
     )
 
     def steps_count(self , obj):
-        return obj.steps.count()
+        return obj.total_steps
 
     steps_count.short_description = 'Number of Steps'
+    steps_count.admin_order_field = 'total_steps'
 
     def execution_status(self , obj):
-        steps = obj.steps.all()
-        if not steps:
+        total = obj.total_steps
+        if not total:
             return 'No Steps'
 
-        total = steps.count()
-        passed = steps.filter(status='passed').count()
-        failed = steps.filter(status='failed').count()
-        not_executed = steps.filter(status='not_executed').count()
+        passed = obj.passed_steps
 
-        if not_executed == total:
+        if obj.not_executed_steps == total:
             return format_html('<span style="color: #666;">Not Started</span>')
-        elif failed > 0:
+        elif obj.failed_steps > 0:
             return format_html('<span style="color: #dc3545;">Failed ({}/{})</span>' , passed , total)
         elif passed == total:
             return format_html('<span style="color: #28a745;">Passed ({}/{})</span>' , passed , total)
@@ -164,6 +172,23 @@ class TestCaseAdmin(ImportExportModelAdmin):
             return format_html('<span style="color: #ffc107;">In Progress ({}/{})</span>' , passed , total)
 
     execution_status.short_description = 'Execution Status'
+    execution_status.admin_order_field = 'passed_steps'
+
+    def propagate_blocked_status(self , request , queryset):
+        project_ids = queryset.order_by().values_list('project_id' , flat=True).distinct()
+        blocked = 0
+        for project_id in project_ids:
+            result = dependencies.propagate_blocked_status(project_id)
+            blocked += len(result['blocked'])
+            if result['cycle']:
+                self.message_user(
+                    request ,
+                    'Test cases %s depend on each other in a cycle' % ' -> '.join(map(str , result['cycle'])) ,
+                    messages.WARNING
+                )
+        self.message_user(request , f'{blocked} dependent test cases marked as blocked')
+
+    propagate_blocked_status.short_description = "Block test cases depending on failed ones in the selected projects"
 
     def save_model(self , request , obj , form , change):
         if not change:  # If creating new object
@@ -189,7 +214,43 @@ class TestCaseAdmin(ImportExportModelAdmin):
 
     def get_queryset(self , request):
         qs = super().get_queryset(request)
-        return qs.select_related('project' , 'category' , 'priority' , 'assigned_to')
+        return qs.select_related('project' , 'category' , 'priority' , 'assigned_to').with_step_counts()
+
+    def get_urls(self):
+        info = self.opts.app_label , self.opts.model_name
+        return [
+            path(
+                'export/stream/' ,
+                self.admin_site.admin_view(self.stream_export_view) ,
+                name='%s_%s_stream_export' % info ,
+            ) ,
+        ] + super().get_urls()
+
+    def stream_export_view(self , request):
+        """Stream the filtered changelist as CSV in chunks instead of building the export in memory"""
+        if not self.has_export_permission(request):
+            raise PermissionDenied
+        resource_class = self.get_export_resource_classes(request)[0]
+        resource = resource_class(**self.get_export_resource_kwargs(request))
+        queryset = self.get_export_queryset(request)
+        filename = f'TestCase-{timezone.now():%Y-%m-%d}'
+        return streaming_export(resource.get_export_headers() , resource.iter_export(queryset) , 'csv' , filename)
+
+    def get_search_results(self , request , queryset , search_term):
+        """
+        Search title and description through the full-text index instead of
+        LIKE scans. As with ``search_fields``, every word must match one of
+        them or the project name.
+        """
+        if not search_term:
+            return super().get_search_results(request , queryset , search_term)
+        backend = get_search_backend(queryset.db)
+        matches = Q()
+        for word in smart_split(search_term):
+            if word.startswith(('"' , "'")) and word[0] == word[-1]:
+                word = unescape_string_literal(word)
+            matches &= backend.matches(TestCase , word) | Q(project__name__icontains=word)
+        return queryset.filter(matches) , False
 
     class Media:
         css = {
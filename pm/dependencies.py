@@ -0,0 +1,45 @@
+"""
+Blocked status propagation across ``TestCase.dependent_on``.
+
+A failed or blocked test case blocks every case that depends on it,
+directly or transitively. ``propagate_blocked_status`` loads a project's
+cases and dependency edges with one query each, computes the affected
+cases in memory and marks them with a single update.
+"""
+from django.utils import timezone
+
+from core.graph import CycleError, DependencyGraph
+from .models import TestCase
+
+# Statuses that block the cases depending on them
+BLOCKING_STATUSES = ('failed', 'blocked')
+# Statuses of cases that still have to be run
+RUNNABLE_STATUSES = ('draft', 'ready', 'in_progress')
+
+
+def propagate_blocked_status(project_id):
+    """
+    Block every case of the project that depends on a failed or blocked
+    case. Returns the ids of the newly blocked cases, the runnable cases in
+    an order that runs dependencies first, and the cycle that prevents
+    ordering them, if any.
+    """
+    statuses = dict(TestCase.objects.filter(project_id=project_id).order_by('pk').values_list('pk', 'status'))
+    edges = list(TestCase.dependent_on.through.objects.filter(
+        from_testcase__project_id=project_id
+    ).values_list('from_testcase_id', 'to_testcase_id'))
+
+    sources = [pk for pk, status in statuses.items() if status in BLOCKING_STATUSES]
+    affected = DependencyGraph(list(statuses), edges).dependents(sources)
+    blocked = sorted(pk for pk in affected if statuses[pk] not in BLOCKING_STATUSES)
+    if blocked:
+        TestCase.objects.filter(pk__in=blocked).update(status='blocked', updated_at=timezone.now())
+        statuses.update(dict.fromkeys(blocked, 'blocked'))
+
+    # Dependencies on cases that are no longer runnable have already run
+    runnable = [pk for pk, status in statuses.items() if status in RUNNABLE_STATUSES]
+    try:
+        execution_order, cycle = DependencyGraph(runnable, edges).topological_ids(), None
+    except CycleError as e:
+        execution_order, cycle = [], e.cycle
+    return {'blocked': blocked, 'execution_order': execution_order, 'cycle': cycle}
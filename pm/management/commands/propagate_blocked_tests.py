@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from core.models import Project
+from pm.dependencies import propagate_blocked_status
+
+
+class Command(BaseCommand):
+    help = 'Block test cases that depend on failed or blocked ones and print the execution order of the rest'
+
+    def add_arguments(self, parser):
+        parser.add_argument('project_ids', nargs='*', type=int, help='Only these projects (default: all)')
+
+    def handle(self, *args, **options):
+        project_ids = options['project_ids'] or Project.objects.order_by('pk').values_list('pk', flat=True)
+        for project_id in project_ids:
+            result = propagate_blocked_status(project_id)
+            self.stdout.write(f'Project {project_id}: {len(result["blocked"])} test cases blocked')
+            if result['cycle']:
+                cycle = ' -> '.join(str(pk) for pk in result['cycle'])
+                self.stdout.write(self.style.WARNING(f'Project {project_id}: dependency cycle {cycle}'))
+            else:
+                order = ', '.join(str(pk) for pk in result['execution_order'])
+                self.stdout.write(f'Project {project_id}: execution order {order or "-"}')
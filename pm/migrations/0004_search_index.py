@@ -0,0 +1,31 @@
+import importlib
+
+from django.db import migrations
+
+# The frozen FTS5 helpers of the migration that indexed core's tables
+fts5 = importlib.import_module('core.migrations.0005_search_indexes')
+
+# Table, primary key and text columns indexed by this migration
+TABLE, PK, NAMES = 'pm_testcase', 'id', ['title', 'description']
+
+
+def install_search_index(apps, schema_editor):
+    if fts5.fts5_supported(schema_editor.connection):
+        fts5.install_fts5(schema_editor, TABLE, PK, NAMES)
+
+
+def uninstall_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        fts5.uninstall_fts5(schema_editor, TABLE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_search_indexes'),
+        ('pm', '0003_testcase_created_by'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
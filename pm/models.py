@@ -38,6 +38,17 @@ class TestEnvironment(models.Model):
         return self.name
 
 
+class TestCaseQuerySet(models.QuerySet):
+    def with_step_counts(self):
+        """Annotate the number of steps in total and per execution status"""
+        return self.annotate(
+            total_steps=models.Count('steps') ,
+            passed_steps=models.Count('steps' , filter=models.Q(steps__status='passed')) ,
+            failed_steps=models.Count('steps' , filter=models.Q(steps__status='failed')) ,
+            not_executed_steps=models.Count('steps' , filter=models.Q(steps__status='not_executed')) ,
+        )
+
+
 class TestCase(models.Model):
     STATUS_CHOICES = [
         ('draft' , 'Draft') ,
@@ -135,6 +146,8 @@ class TestCase(models.Model):
         help_text="Estimated time to execute this test case"
     )
 
+    objects = TestCaseQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.project.name} - {self.title}"
 
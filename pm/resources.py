@@ -1,6 +1,7 @@
 # In resources.py
 from import_export import resources, fields
 from import_export.widgets import ForeignKeyWidget
+from django.db.models import Prefetch
 from .models import TestCase, TestStep
 
 class TestStepResource(resources.ModelResource):
@@ -43,7 +44,31 @@ class TestCaseResource(resources.ModelResource):
             "description",
             'steps', 
         )
-    
+        # Rows fetched per query; steps and dependencies are prefetched per chunk
+        chunk_size = 2000
+
+    def filter_export(self, queryset, **kwargs):
+        """Join the foreign keys and prefetch steps and dependencies for every exported chunk"""
+        return queryset.select_related(
+            'project', 'category', 'priority', 'environment', 'assigned_to', 'created_by'
+        ).prefetch_related(
+            Prefetch('steps', queryset=TestStep.objects.order_by('step_number')),
+            Prefetch('dependent_on', queryset=TestCase.objects.only('id')),
+        )
+
+    def iter_queryset(self, queryset):
+        # QuerySet.iterator() prefetches per chunk when given a chunk size, which
+        # avoids the COUNT and OFFSET queries of the paginated default
+        yield from queryset.iterator(chunk_size=self.get_chunk_size())
+
+    def iter_export(self, queryset=None, export_fields=None, **kwargs):
+        """Yield the exported rows one at a time instead of building a ``Dataset``"""
+        if queryset is None:
+            queryset = self.get_queryset()
+        queryset = self.filter_export(queryset, **kwargs)
+        for obj in self.iter_queryset(queryset):
+            yield self.export_resource(obj, selected_fields=export_fields, **kwargs)
+
     def dehydrate_steps(self, obj):
         """
         Return a string of all test steps for this test case.
@@ -51,5 +76,5 @@ class TestCaseResource(resources.ModelResource):
         """
         return " | ".join(
             f"Step {step.step_number}: {step.action} - {step.expected_result} - {step.actual_result} - {step.status} - {step.screenshot}"
-            for step in obj.steps.all().order_by('step_number')
+            for step in obj.steps.all()
         )
\ No newline at end of file
@@ -1,3 +1,159 @@
+import csv
+import io
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from core import benchmarks
+from core.models import Employee, Project, Team
+from .models import TestCase as Case, TestStep
+from .dependencies import propagate_blocked_status
+from .resources import TestCaseResource
+
+
+class PMTestCase(TestCase):
+    """Base class with a project to attach test cases to"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        employee = Employee.objects.create(user=cls.user, position='QA')
+        team = Team.objects.create(name='QA')
+        cls.project = Project.objects.create(
+            name='Checkout', description='Checkout', start_date=timezone.now().date(),
+            team=team, project_manager=employee,
+        )
+
+    def create_case(self, title, **kwargs):
+        kwargs.setdefault('description', title)
+        return Case.objects.create(project=self.project, title=title, **kwargs)
+
+
+class TestCaseAdminTests(PMTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_full_text_search(self):
+        payment = self.create_case('Payment declined', description='Card is rejected by the gateway')
+        self.create_case('Address form')
+        response = self.client.get(reverse('admin:pm_testcase_changelist'), {'q': 'gate'})
+        self.assertEqual(list(response.context['cl'].result_list), [payment])
+
+    def test_step_counts(self):
+        case = self.create_case('Login')
+        for number, status in enumerate(['passed', 'passed', 'failed', 'not_executed'], start=1):
+            TestStep.objects.create(test_case=case, step_number=number, action='Act', expected_result='Ok',
+                                    status=status)
+        self.create_case('Logout')
+        cases = {case.title: case for case in Case.objects.with_step_counts()}
+        self.assertEqual(
+            (cases['Login'].total_steps, cases['Login'].passed_steps, cases['Login'].failed_steps,
+             cases['Login'].not_executed_steps),
+            (4, 2, 1, 1),
+        )
+        self.assertEqual(cases['Logout'].total_steps, 0)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        url = reverse('admin:pm_testcase_changelist')
+        self.create_case('Login')
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        for number in range(10):
+            case = self.create_case(f'Case {number}')
+            TestStep.objects.create(test_case=case, step_number=1, action='Act', expected_result='Ok')
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url, {'o': '9'})
+        self.assertContains(response, 'Not Started')
+        self.assertEqual(len(small), len(large))
+
+    def test_search_by_project_name(self):
+        self.create_case('Address form')
+        response = self.client.get(reverse('admin:pm_testcase_changelist'), {'q': 'checkout'})
+        self.assertEqual(response.context['cl'].result_count, 1)
+
+    def test_search_words_match_any_field(self):
+        address = self.create_case('Address form')
+        self.create_case('Payment form')
+        response = self.client.get(reverse('admin:pm_testcase_changelist'), {'q': 'checkout addr'})
+        self.assertEqual(list(response.context['cl'].result_list), [address])
+        response = self.client.get(reverse('admin:pm_testcase_changelist'), {'q': 'address missing'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+
+class BlockedPropagationTests(PMTestCase):
+    def test_propagation(self):
+        login = self.create_case('Login', status='failed')
+        cart = self.create_case('Cart', status='ready')
+        checkout = self.create_case('Checkout', status='passed')
+        search = self.create_case('Search', status='ready')
+        filters = self.create_case('Filters', status='draft')
+        cart.dependent_on.add(login)
+        checkout.dependent_on.add(cart)
+        filters.dependent_on.add(search)
+
+        with CaptureQueriesContext(connection) as queries:
+            result = propagate_blocked_status(self.project.pk)
+        self.assertEqual(len(queries), 3)
+        self.assertEqual(result['blocked'], [cart.pk, checkout.pk])
+        self.assertEqual(result['execution_order'], [search.pk, filters.pk])
+        self.assertIsNone(result['cycle'])
+        self.assertEqual(
+            set(Case.objects.filter(status='blocked').values_list('pk', flat=True)), {cart.pk, checkout.pk}
+        )
+
+    def test_cycle(self):
+        first = self.create_case('First', status='ready')
+        second = self.create_case('Second', status='ready')
+        first.dependent_on.add(second)
+        second.dependent_on.add(first)
+        result = propagate_blocked_status(self.project.pk)
+        self.assertEqual(result['execution_order'], [])
+        self.assertEqual(result['cycle'][0], result['cycle'][-1])
+
+    def test_admin_action(self):
+        self.client.force_login(self.user)
+        failed = self.create_case('Login', status='failed')
+        dependent = self.create_case('Cart', status='ready')
+        dependent.dependent_on.add(failed)
+        self.client.post(reverse('admin:pm_testcase_changelist'), {
+            'action': 'propagate_blocked_status', '_selected_action': [failed.pk],
+        })
+        dependent.refresh_from_db()
+        self.assertEqual(dependent.status, 'blocked')
+
+
+class TestCaseExportTests(PMTestCase):
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def test_steps_and_dependencies(self):
+        login = self.create_case('Login')
+        checkout = self.create_case('Checkout', assigned_to=self.user)
+        checkout.dependent_on.add(login)
+        TestStep.objects.create(test_case=checkout, step_number=2, action='Pay', expected_result='Paid')
+        TestStep.objects.create(test_case=checkout, step_number=1, action='Add', expected_result='Added')
+        resource = TestCaseResource()
+        headers = resource.get_export_headers()
+        rows = [dict(zip(headers, values)) for values in resource.iter_export(Case.objects.all())]
+        rows = {row['title']: row for row in rows}
+        self.assertEqual(rows['Checkout']['dependent_on'], str(login.pk))
+        self.assertEqual(rows['Checkout']['assigned_to'], self.user.pk)
+        self.assertTrue(rows['Checkout']['steps'].startswith('Step 1: Add'))
+        self.assertIn('| Step 2: Pay', rows['Checkout']['steps'])
+
+    def test_stream_export_view(self):
+        self.create_case('Login', status='ready')
+        self.create_case('Logout')
+        response = self.client.get(reverse('admin:pm_testcase_stream_export'), {'status__exact': 'ready'})
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual([row['title'] for row in rows], ['Login'])
 
-# Create your tests here.
+    def test_export_queries_do_not_grow_with_suite_size(self):
+        benchmarks.seed_dataset(tasks_per_project=1, cases_per_project=25)
+        small, _, large, _ = benchmarks.export_scaling([10, 100])
+        self.assertEqual((small['rows'], large['rows']), (10, 100))
+        self.assertEqual(small['queries'], large['queries'])